@@ -1,9 +1,10 @@
 import os
+import re
 import json
 import time
 import chainlit as cl
+from typing import Optional
 from openai import AsyncOpenAI
-import tiktoken
 
 from src.config.settings import (
     OPENAI_API_KEY,
@@ -12,10 +13,12 @@ from src.config.settings import (
     FRIENDLI_TOKEN,
     TOKEN_THRESHOLD,
     MAX_ITER,
+    RAG_CONTEXT_TOKENS,
     XPANDER_ORGANIZATION_ID,
     XPANDER_BASE_URL
 )
-from src.database.vector_store import vector_store
+from src.database.search_results import assemble_context
+from src.database.store_manager import store_manager, current_tenant
 from src.tools.local_tools import (
     fetch_youtube_transcript,
     read_file,
@@ -32,6 +35,8 @@ from src.tools.local_tools import (
     local_tools
 )
 from src.utils.query_logger import query_logger
+from src.utils.tokenizer import count_tokens
+from src.utils.offload import run_blocking
 
 from xpander_sdk import XpanderClient, ToolCallType, LLMProvider
 
@@ -78,9 +83,16 @@ tools = xpander_agent.get_tools()
 # ----------------------------------------------------------------
 cl.instrument_openai()
 
+def session_tenant():
+    """Tenant id of the current Chainlit session: the signed-in user's identifier (None when anonymous)."""
+    user = cl.user_session.get("user")
+    return getattr(user, "identifier", None)
+
 @cl.on_chat_start
 def start_chat():
     """Initialize chat session with improved system prompt."""
+    # Background retention and idle-shard unloading (no-op after the first session)
+    store_manager.start_maintenance()
     cl.user_session.set("cached_outputs", {})
     cl.user_session.set("message_history", [
         {
@@ -109,6 +121,11 @@ def start_chat():
     ])
     print("[CHAINLIT] Chat session initialized with enhanced system prompt.")
 
+def youtube_video_id(text: str) -> Optional[str]:
+    """Video id of the first YouTube URL in text (youtube.com/watch?v=... or youtu.be/...), if any."""
+    match = re.search(r"(?:youtube\.com/watch\?(?:\S*?&)?v=|youtu\.be/)([\w-]{11})", text)
+    return match.group(1) if match else None
+
 async def auto_rag_prepend(user_text: str, top_k: int = 3) -> str:
     """Enhanced RAG with better context handling and query processing."""
     print(f"[AUTO-RAG] Processing query: {user_text[:60]}")
@@ -119,13 +136,15 @@ async def auto_rag_prepend(user_text: str, top_k: int = 3) -> str:
         return user_text
         
     # If it's a YouTube URL, try to find existing transcript first
-    if "youtube.com/watch?v=" in query or "youtu.be/" in query:
-        video_id = query.split("v=")[-1].split("&")[0]
+    video_id = youtube_video_id(query)
+    if video_id:
         source_id = f"youtube_transcript_{video_id}"
         
         try:
-            # Search specifically for this transcript
-            hits = vector_store.search(query=source_id, top_k=1)
+            # Exact source lookup: the metadata filter admits only this video's chunks, and the
+            # BM25 index (which includes the source name) ranks them without an embedding call
+            hits = await store_manager.search_async(query=source_id, top_k=1, mode="lexical",
+                                                    filters={"source": source_id})
             
             if hits:
                 print(f"[AUTO-RAG] Found existing transcript for video {video_id}")
@@ -141,26 +160,21 @@ async def auto_rag_prepend(user_text: str, top_k: int = 3) -> str:
             
     # Regular search for other queries or if no transcript found
     try:
-        hits = vector_store.search(query=query, top_k=top_k)
+        # Past assistant answers are not context; filter them out before ranking so they do not take top-k slots
+        hits = await store_manager.search_with_scores_async(
+            query=query, top_k=top_k, filters={"exclude_source": "assistant_answer"}
+        )
         
         if not hits:
             print("[AUTO-RAG] No relevant hits found in initial search.")
             return user_text
             
-        # Process and format the context
-        contexts = []
-        for hit in hits:
-            if isinstance(hit, str):
-                # Skip assistant answers
-                if hit.startswith('[assistant_answer]'):
-                    continue
-                contexts.append(hit.strip())
-        
-        if not contexts:
+        # Pack the best hits (with their source) into the prompt token budget
+        context_str, packed = await run_blocking(assemble_context, hits, RAG_CONTEXT_TOKENS)
+        if not packed:
             return user_text
+        print(f"[AUTO-RAG] Using {len(packed)}/{len(hits)} hits within {RAG_CONTEXT_TOKENS} tokens")
             
-        # Combine contexts and original query
-        context_str = "\n\n".join(contexts)
         return (
             "Note: The following context is for reference only. You should still use appropriate tools to handle the user's request.\n\n"
             f"Context from memory:\n{context_str}\n\n"
@@ -292,7 +306,7 @@ async def xpander_tool(llm_response, message_history):
                 file_path = f"knowledge_repo/{video_id}_transcript.txt"
                 
                 # Fetch and process transcript in one go
-                r = fetch_youtube_transcript(video_url)
+                r = await run_blocking(fetch_youtube_transcript, video_url)
                 if not r.get("success"):
                     result = r
                     current_step.output = result
@@ -307,7 +321,7 @@ async def xpander_tool(llm_response, message_history):
                 os.makedirs(os.path.dirname(file_path), exist_ok=True)
                 with open(file_path, "w", encoding="utf-8") as f:
                     f.write(r.get("transcript", ""))
-                vector_store.add_text(r.get("transcript", ""), f"youtube_transcript_{video_id}")
+                await store_manager.add_text_async(r.get("transcript", ""), f"youtube_transcript_{video_id}")
                 
                 # Generate summary file immediately
                 if r.get("summary"):
@@ -378,28 +392,31 @@ Just let me know what interests you most."""
                 )
                 result = w
             elif tc.name == "memory-search":
-                r = memory_search(
+                r = await run_blocking(
+                    memory_search,
                     local_params["query"],
-                    local_params.get("top_k", 3)
+                    local_params.get("top_k", 3),
+                    local_params.get("source"),
+                    local_params.get("neighbors")
                 )
                 result = r
             elif tc.name == "list-memories":
-                r = list_memories()
+                r = await run_blocking(list_memories)
                 result = r
             elif tc.name == "get-memory-stats":
-                r = get_memory_stats()
+                r = await run_blocking(get_memory_stats)
                 result = r
             elif tc.name == "delete-memory":
-                r = delete_memory(local_params["memory_id"])
+                r = await run_blocking(delete_memory, local_params["memory_id"])
                 result = r
             elif tc.name == "delete-source":
-                r = delete_source(local_params["source"])
+                r = await run_blocking(delete_source, local_params["source"])
                 result = r
             elif tc.name == "clean-duplicates":
-                r = clean_duplicates()
+                r = await run_blocking(clean_duplicates)
                 result = r
             elif tc.name == "clear-all-memories":
-                r = clear_all_memories()
+                r = await run_blocking(clear_all_memories)
                 result = r
             elif tc.name == "read-query-logs":
                 r = read_query_logs(
@@ -418,9 +435,9 @@ Just let me know what interests you most."""
                 result = {"error": f"Unknown local tool: {tc.name}"}
 
             text_json = json.dumps(result, ensure_ascii=False)
-            tok = len(tiktoken.encoding_for_model("gpt-4").encode(text_json))
+            tok = count_tokens(text_json, limit=TOKEN_THRESHOLD)
             if tok > TOKEN_THRESHOLD:
-                vector_store.add_text(text_json, tc.name)
+                await store_manager.add_text_async(text_json, tc.name)
                 result = {
                     "info": "Tool result huge => chunked rest of the data to DB.",
                     "content": text_json[:int(TOKEN_THRESHOLD * 0.8)]
@@ -443,9 +460,9 @@ Just let me know what interests you most."""
         else:
             function_response = xpander_agent.run_tool(tc)
             text_repr = json.dumps(function_response.result, ensure_ascii=False)
-            tok = len(tiktoken.encoding_for_model("gpt-4").encode(text_repr))
+            tok = count_tokens(text_repr, limit=TOKEN_THRESHOLD)
             if tok > TOKEN_THRESHOLD:
-                vector_store.add_text(text_repr, tc.name)
+                await store_manager.add_text_async(text_repr, tc.name)
                 short_msg = {"info": f"Output from xpander tool '{tc.name}' was large => stored in DB."}
                 current_step.output = short_msg
                 current_step.language = "json"
@@ -537,6 +554,9 @@ async def multi_pass_rag(msg: cl.Message):
          - Generate downloadable summary file
          - Store in vector store
     """
+    # Route this message's memory reads/writes to the user's shard (and the shared store)
+    current_tenant.set(session_tenant())
+
     # 1) auto-rag prepend
     user_txt_with_ctx = await auto_rag_prepend(msg.content, top_k=5)
 
@@ -606,9 +626,9 @@ async def multi_pass_rag(msg: cl.Message):
         error_msg = cl.Message(content="⚠️ No final answer after multiple passes.")
         await error_msg.send()
 
-    # Store the final answer in vector store if we have one
+    # Store the final answer in vector store in the background so the reply isn't delayed
     if final_ans:
-        vector_store.add_text(final_ans, "assistant_answer")
+        await store_manager.schedule_add_text(final_ans, "assistant_answer")
 
 if __name__ == "__main__":
     from chainlit.cli import run_chainlit
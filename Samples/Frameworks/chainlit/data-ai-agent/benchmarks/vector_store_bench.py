@@ -0,0 +1,409 @@
+"""
+Offline VectorStore benchmark.
+
+Builds synthetic stores with the deterministic hashing embedder (no API calls;
+tiktoken's cl100k_base file must be available locally) and, for each storage /
+index mode and store size, reports:
+
+- add_text throughput (chunks/s) while growing the store to that size
+- search latency p50/p99 (dense search with a precomputed query embedding)
+- recall@k against an exact float32 scan of the same chunks
+- cold init_store time after the store is closed (snapshotted) and reopened
+- persisted size on disk and process RSS
+- for modes run alongside "exact": search latency and disk size relative to it
+
+Before the modes run, the same document (and variants sharing most of its
+chunks) is ingested from several threads and coroutines at once; the run fails
+if the store keeps more than one row per unique chunk.
+
+Run from the app directory, e.g.
+
+    python -m benchmarks.vector_store_bench --sizes 1000,10000 --modes exact,ivf,int8
+    python -m benchmarks.vector_store_bench --sizes 100000 --json after.json --baseline before.json
+
+Stores are written under --dir (a fresh temporary directory by default), never
+into knowledge_repo. With --baseline, metrics that got worse by more than
+--tolerance against a previous --json run are flagged.
+"""
+import os
+import io
+import sys
+import json
+import time
+import random
+import asyncio
+import shutil
+import argparse
+import tempfile
+import threading
+import contextlib
+import numpy as np
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.config import settings
+from src.database import embedders
+from src.database import vector_store as vector_store_module
+from src.database.vector_store import VectorStore
+
+# Settings overrides per benchmark mode, applied on top of BASE_SETTINGS
+MODES: Dict[str, Dict[str, Any]] = {
+    "exact": {},
+    "ivf": {"ANN_INDEX_ENABLED": True},
+    "float16": {"EMBEDDING_DTYPE": "float16"},
+    "int8": {"EMBEDDING_DTYPE": "int8"},
+    "pq": {"PQ_ENABLED": True},
+    "coarse": {"COARSE_SEARCH_DIMENSIONS": 64},
+    "ivf-int8": {"ANN_INDEX_ENABLED": True, "EMBEDDING_DTYPE": "int8"},
+    "ivf-pq": {"ANN_INDEX_ENABLED": True, "PQ_ENABLED": True},
+}
+
+# Every mode starts from an exact float32 scan; the indexes apply from the first row
+# and the query cache is off so every search is measured.
+BASE_SETTINGS: Dict[str, Any] = {
+    "EMBEDDER": "hashing",
+    "EMBED_DIMENSIONS": None,
+    "EMBEDDING_DTYPE": "float32",
+    "ANN_INDEX_ENABLED": False,
+    "ANN_MIN_ROWS": 0,
+    "PQ_ENABLED": False,
+    "PQ_MIN_ROWS": 0,
+    "COARSE_SEARCH_DIMENSIONS": 0,
+    "QUERY_CACHE_SIZE": 0,
+    "SUMMARY_MODE": "lazy",  # No summary requests while ingesting
+}
+
+# Metrics where a larger value is a regression (the others regress by shrinking)
+LOWER_IS_BETTER = {"search_p50_ms", "search_p99_ms", "first_search_ms", "cold_init_s", "disk_bytes", "rss_bytes"}
+
+
+def apply_settings(overrides: Dict[str, Any]):
+    """Set settings both in src.config.settings and in the modules that imported them by value."""
+    for name, value in overrides.items():
+        if not hasattr(settings, name):
+            raise ValueError(f"Unknown setting {name!r}")
+        for module in (settings, vector_store_module, embedders):
+            if hasattr(module, name):
+                setattr(module, name, value)
+
+
+def parse_override(item: str) -> Tuple[str, Any]:
+    """NAME=VALUE with VALUE parsed as JSON when possible (numbers, true/false, null)."""
+    name, _, value = item.partition("=")
+    try:
+        return name, json.loads(value)
+    except ValueError:
+        return name, value
+
+
+class Corpus:
+    """
+    Deterministic synthetic documents: sentences of made-up words drawn from a
+    few dozen topics with Zipf-like word frequencies, so texts on one topic share
+    vocabulary the way real documents do. Queries are word windows sampled
+    (reservoir) from the documents generated so far, with their own random
+    stream so the documents do not depend on the number of queries.
+    """
+
+    SYLLABLES = ["ka", "lo", "mi", "ren", "tas", "vo", "shi", "pa", "dur", "el", "ni", "qua", "zo", "bet", "ra", "fin"]
+
+    def __init__(self, seed: int, vocabulary: int = 20000, topics: int = 50, topic_words: int = 400,
+                 query_words: int = 12, queries: int = 200):
+        self.rng = random.Random(seed)
+        self.query_rng = random.Random(seed + 1)
+        words = set()
+        while len(words) < vocabulary:
+            words.add("".join(self.rng.choice(self.SYLLABLES) for _ in range(self.rng.randint(2, 4))))
+        self.words = sorted(words)
+        self.topics = [self.rng.sample(self.words, topic_words) for _ in range(topics)]
+        self.weights = [1.0 / (rank + 1) for rank in range(topic_words)]
+        self.query_words = query_words
+        self.max_queries = queries
+        self.queries: List[str] = []
+        self._windows_seen = 0
+        self.documents = 0
+
+    def _sentence(self, topic: List[str]) -> str:
+        words = self.rng.choices(topic, self.weights, k=self.rng.randint(8, 20))
+        words += self.rng.sample(self.words, 2)  # A little off-topic noise
+        self.rng.shuffle(words)
+        return " ".join(words).capitalize() + "."
+
+    def document(self, approx_words: int) -> str:
+        topic = self.topics[self.rng.randrange(len(self.topics))]
+        paragraphs, count = [], 0
+        while count < approx_words:
+            paragraph = " ".join(self._sentence(topic) for _ in range(self.rng.randint(3, 7)))
+            paragraphs.append(paragraph)
+            count += paragraph.count(" ") + 1
+        text = "\n\n".join(paragraphs)
+        self._sample_query(text)
+        self.documents += 1
+        return text
+
+    def _sample_query(self, text: str):
+        words = text.replace(".", "").split()
+        start = self.query_rng.randrange(max(len(words) - self.query_words, 1))
+        window = " ".join(words[start:start + self.query_words]).lower()
+        self._windows_seen += 1
+        if len(self.queries) < self.max_queries:
+            self.queries.append(window)
+        else:
+            slot = self.query_rng.randrange(self._windows_seen)
+            if slot < self.max_queries:
+                self.queries[slot] = window
+
+
+def embed(texts: List[str], dimensions: Optional[int]) -> np.ndarray:
+    return np.stack(embedders.get_embedder("hashing").embed(texts, dimensions))
+
+
+def exact_neighbors(texts: List[str], queries: np.ndarray, top_k: int,
+                    block: int = 4096) -> List[set]:
+    """Ground truth: top_k texts per query by a float32 scan over freshly embedded texts."""
+    best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+    best_rows = np.empty((len(queries), 0), dtype=np.int64)
+    for start in range(0, len(texts), block):
+        vectors = embed(texts[start:start + block], queries.shape[1])
+        scores = np.concatenate([best_scores, queries @ vectors.T], axis=1)
+        rows = np.concatenate([best_rows, np.broadcast_to(np.arange(start, start + len(vectors)), (len(queries), len(vectors)))], axis=1)
+        keep = np.argsort(-scores, axis=1, kind="stable")[:, :top_k]
+        best_scores = np.take_along_axis(scores, keep, axis=1)
+        best_rows = np.take_along_axis(rows, keep, axis=1)
+    return [{texts[row] for row in rows} for rows in best_rows]
+
+
+def directory_bytes(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            total += os.path.getsize(os.path.join(root, name))
+    return total
+
+
+def rss_bytes() -> int:
+    """Current resident set size (peak RSS where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def percentile(values: List[float], q: float) -> float:
+    return float(np.percentile(values, q)) if values else 0.0
+
+
+@contextlib.contextmanager
+def quiet(enabled: bool):
+    """Silence the store's per-document [VDB]/[EMBED] prints unless --verbose."""
+    if not enabled:
+        yield
+        return
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+def measure(store: VectorStore, queries: List[str], query_vectors: np.ndarray, top_k: int,
+            truth: Optional[List[set]]) -> Dict[str, Any]:
+    """Search latency and recall (the first search is reported apart: it builds lazy indexes)."""
+    latencies, recalls = [], []
+    first_search_ms = None
+    for query, vector, expected in zip(queries, query_vectors, truth or [None] * len(queries)):
+        start = time.perf_counter()
+        hits = store.search_with_scores(query, top_k, min_similarity=0.0, rerank=False, mode="dense", query_embedding=vector)
+        elapsed = (time.perf_counter() - start) * 1000
+        if first_search_ms is None:
+            first_search_ms = elapsed
+        else:
+            latencies.append(elapsed)
+        if expected:
+            recalls.append(len(expected & {hit.text for hit in hits}) / len(expected))
+    return {
+        "first_search_ms": round(first_search_ms or 0.0, 3),
+        "search_p50_ms": round(percentile(latencies, 50), 3),
+        "search_p99_ms": round(percentile(latencies, 99), 3),
+        f"recall@{top_k}": round(float(np.mean(recalls)), 4) if recalls else None,
+    }
+
+
+def run_mode(mode: str, sizes: List[int], args, truth_cache: Dict[int, List[set]]) -> List[Dict[str, Any]]:
+    apply_settings({**BASE_SETTINGS, **MODES[mode], **dict(args.set)})
+    directory = os.path.join(args.dir, mode)
+    shutil.rmtree(directory, ignore_errors=True)
+    corpus = Corpus(args.seed, queries=args.queries)
+    with quiet(not args.verbose):
+        store = VectorStore(directory)
+
+    results = []
+    for size in sizes:
+        added_chunks, ingest_seconds = store.live_count, 0.0
+        with quiet(not args.verbose):
+            while store.live_count < size:
+                text = corpus.document(args.doc_words)
+                start = time.perf_counter()
+                store.add_text(text, f"doc-{corpus.documents}")
+                ingest_seconds += time.perf_counter() - start
+            added_chunks = store.live_count - added_chunks
+
+            store.close()
+            start = time.perf_counter()
+            store = VectorStore(directory)
+            cold_init_s = time.perf_counter() - start
+
+        texts = [entry["text"] for entry in store._live_entries()]
+        query_vectors = embed(corpus.queries, store.embedding_dim)
+        truth = truth_cache.get(len(texts))
+        if truth is None and not args.no_recall:
+            truth = truth_cache[len(texts)] = exact_neighbors(texts, query_vectors, args.top_k)
+
+        row = {
+            "mode": mode,
+            "size": size,
+            "chunks": store.live_count,
+            "documents": corpus.documents,
+            "add_chunks_per_s": round(added_chunks / ingest_seconds, 1) if ingest_seconds else None,
+            "cold_init_s": round(cold_init_s, 4),
+            "disk_bytes": directory_bytes(directory),
+            **measure(store, corpus.queries, query_vectors, args.top_k, truth),
+            "rss_bytes": rss_bytes(),
+        }
+        print(json.dumps(row))
+        results.append(row)
+
+    with quiet(not args.verbose):
+        store.close()
+    if not args.keep:
+        shutil.rmtree(directory, ignore_errors=True)
+    return results
+
+
+def check_concurrent_ingest(args, writers: int = 4) -> bool:
+    """
+    Ingest one document, and variants of it with one extra paragraph each, from
+    `writers` threads (add_text) and then `writers` coroutines (add_text_async)
+    at once. True if the store ends up with exactly one row per unique chunk.
+    """
+    apply_settings({**BASE_SETTINGS, **dict(args.set)})
+    directory = os.path.join(args.dir, "concurrent-ingest")
+    shutil.rmtree(directory, ignore_errors=True)
+    corpus = Corpus(args.seed)
+    text = corpus.document(args.doc_words)
+    documents = [text] * writers + [f"{text}\n\n{corpus.document(40)}" for _ in range(writers)]
+
+    def ingest_threads(store: VectorStore):
+        threads = [threading.Thread(target=store.add_text, args=(document, f"thread-{i}"))
+                   for i, document in enumerate(documents)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    async def ingest_tasks(store: VectorStore):
+        await asyncio.gather(*(store.add_text_async(document, f"task-{i}") for i, document in enumerate(documents)))
+
+    ok = True
+    with quiet(not args.verbose):
+        store = VectorStore(directory)
+    for name, ingest in (("threads", ingest_threads), ("async", lambda store: asyncio.run(ingest_tasks(store)))):
+        with quiet(not args.verbose):
+            store.clear_all_memories()
+            ingest(store)
+        unique = len({entry["text_hash"] for entry in store._live_entries()})
+        print(f"[BENCH] concurrent ingest ({name}): {store.live_count} rows for {unique} unique chunks")
+        ok = ok and store.live_count == unique
+    with quiet(not args.verbose):
+        store.close()
+    shutil.rmtree(directory, ignore_errors=True)
+    return ok
+
+
+def print_tradeoffs(results: List[Dict[str, Any]], top_k: int):
+    """For every mode, search latency, disk size and recall relative to the exact float32 scan of the same size."""
+    exact = {row["size"]: row for row in results if row["mode"] == "exact"}
+    for row in results:
+        reference = exact.get(row["size"])
+        if row["mode"] == "exact" or reference is None:
+            continue
+        ratios = []
+        for metric in ("search_p50_ms", "disk_bytes"):
+            if reference[metric]:
+                ratios.append(f"{metric} x{row[metric] / reference[metric]:.2f}")
+        recall = row.get(f"recall@{top_k}")
+        if recall is not None:
+            ratios.append(f"recall@{top_k} {recall}")
+        print(f"[BENCH] {row['mode']} vs exact @ {row['size']}: {', '.join(ratios)}")
+
+
+def compare(results: List[Dict[str, Any]], baseline_path: str, tolerance: float) -> int:
+    """Print metrics that regressed beyond tolerance against a baseline run; returns how many."""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = {(row["mode"], row["size"]): row for row in json.load(f)["results"]}
+    regressions = 0
+    for row in results:
+        previous = baseline.get((row["mode"], row["size"]))
+        if previous is None:
+            continue
+        for metric, value in row.items():
+            old = previous.get(metric)
+            if not isinstance(value, (int, float)) or not isinstance(old, (int, float)) or not old or metric in ("size", "chunks"):
+                continue
+            change = (value - old) / old
+            if metric in LOWER_IS_BETTER and change > tolerance or metric not in LOWER_IS_BETTER and -change > tolerance:
+                regressions += 1
+                print(f"[WARN] {row['mode']} @ {row['chunks']} chunks: {metric} {old} -> {value} ({change:+.0%})")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Offline VectorStore benchmark (hashing embedder, synthetic corpus).")
+    parser.add_argument("--sizes", default="1000,10000", help="Comma-separated store sizes in chunks, grown in order")
+    parser.add_argument("--modes", default="exact,ivf,int8", help=f"Comma-separated modes: {', '.join(MODES)}")
+    parser.add_argument("--queries", type=int, default=200, help="Search queries per measurement")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--doc-words", type=int, default=1500, help="Approximate words per synthetic document")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--set", action="append", type=parse_override, default=[], metavar="NAME=VALUE",
+                        help="Override any setting for every mode, e.g. --set CHUNK_SIZE=200 --set ANN_NPROBE=8")
+    parser.add_argument("--dir", default=None, help="Where stores are built (default: a temporary directory)")
+    parser.add_argument("--keep", action="store_true", help="Keep the built stores")
+    parser.add_argument("--no-recall", action="store_true", help="Skip the exact ground-truth scan")
+    parser.add_argument("--json", help="Write results to this file")
+    parser.add_argument("--baseline", help="Flag regressions against a previous --json file")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative change against --baseline")
+    parser.add_argument("--verbose", action="store_true", help="Show the store's own log lines")
+    args = parser.parse_args(argv)
+
+    sizes = sorted(int(size) for size in args.sizes.split(","))
+    modes = [mode.strip() for mode in args.modes.split(",")]
+    unknown = [mode for mode in modes if mode not in MODES]
+    if unknown:
+        parser.error(f"Unknown modes {unknown}; expected some of {list(MODES)}")
+
+    temporary = args.dir is None
+    args.dir = args.dir or tempfile.mkdtemp(prefix="vector_store_bench-")
+    truth_cache: Dict[int, List[set]] = {}
+    results = []
+    try:
+        if not check_concurrent_ingest(args):
+            print("[ERROR] Concurrent ingestion stored duplicate chunks")
+            return 1
+        for mode in modes:
+            print(f"[BENCH] mode={mode} sizes={sizes} dir={os.path.join(args.dir, mode)}")
+            results.extend(run_mode(mode, sizes, args, truth_cache))
+        print_tradeoffs(results, args.top_k)
+    finally:
+        if temporary and not args.keep:
+            shutil.rmtree(args.dir, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"args": {k: v for k, v in vars(args).items() if k != "dir"}, "results": results}, f, indent=2)
+    if args.baseline:
+        return 1 if compare(results, args.baseline, args.tolerance) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
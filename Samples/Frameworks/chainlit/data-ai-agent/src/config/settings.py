@@ -2,21 +2,97 @@ import os
 
 # Directory and file paths
 KNOWLEDGE_REPO_DIR = "knowledge_repo"
+VECTOR_DB_VECTORS_FILE = os.path.join(KNOWLEDGE_REPO_DIR, "vector_db.npy")  # float32, memory-mapped
+VECTOR_DB_META_FILE = os.path.join(KNOWLEDGE_REPO_DIR, "vector_db.meta.jsonl")  # one entry per row
+EMBED_CACHE_VECTORS_FILE = os.path.join(KNOWLEDGE_REPO_DIR, "embedding_cache.npy")
+EMBED_CACHE_KEYS_FILE = os.path.join(KNOWLEDGE_REPO_DIR, "embedding_cache.keys.jsonl")
+SNAPSHOT_MANIFEST_FILE = os.path.join(KNOWLEDGE_REPO_DIR, "manifest.json")  # current snapshot generation
+JOURNAL_FILE = os.path.join(KNOWLEDGE_REPO_DIR, "journal.jsonl")  # mutations since the snapshot
+BM25_POSTINGS_FILE = os.path.join(KNOWLEDGE_REPO_DIR, "bm25_postings.npy")  # (row, term frequency) pairs grouped by term, memory-mapped
+BM25_TERMS_FILE = os.path.join(KNOWLEDGE_REPO_DIR, "bm25_terms.json")  # terms and their offsets into the postings
+
+# Legacy JSON files, migrated once to the binary format above
 EMBED_CACHE_FILE = os.path.join(KNOWLEDGE_REPO_DIR, "embedding_cache.json")
 VECTOR_DB_FILE = os.path.join(KNOWLEDGE_REPO_DIR, "vector_db.json")
 
 # Embedding models
 PRIMARY_EMBED_MODEL = "text-embedding-3-large"
 FALLBACK_EMBED_MODEL = "text-embedding-3-large"
+EMBED_DIMENSIONS = None  # Shortened text-embedding-3 vectors (e.g. 256/512/1024); None = full size (3072)
 TOKEN_THRESHOLD = 3000
+EMBED_BATCH_MAX_INPUTS = 256  # Max inputs per embeddings request (API limit is 2048)
+EMBED_BATCH_MAX_TOKENS = 100000  # Max total tokens per embeddings request (API limit is 300k)
+EMBED_MAX_CONCURRENCY = 4  # Max concurrent async embeddings requests
+EMBEDDER = "openai"  # Embedding provider: openai, or hashing (deterministic, offline; for tests/benchmarks, use its own knowledge_repo)
+HASHING_EMBED_DIM = 256  # Vector size of the hashing embedder
 
 # Vector store settings
 MAX_CACHE_SIZE = 10000  # Maximum number of embeddings to cache
+MAX_CACHE_BYTES = 256 * 1024 * 1024  # Maximum bytes of cached embedding vectors
+EMBED_CACHE_PERSIST_ENTRIES = 5000  # Most recently used cache entries kept in snapshots
 CHUNK_SIZE = 500  # Token size for each chunk
 CHUNK_OVERLAP = 100  # Overlap between chunks
+NEAR_DUPLICATE_MAX_HAMMING = 3  # SimHash bits two chunks may differ by and still count as duplicates (0 = exact only)
 MIN_SIMILARITY = 0.6  # Default minimum similarity threshold
 DYNAMIC_SIMILARITY = True  # Whether to use dynamic similarity thresholds
 MAX_RERANK_CANDIDATES = 10  # Number of candidates to consider for reranking
+RERANK_ENABLED = True  # Two-stage search: vector candidates above the threshold, then rerank
+MMR_LAMBDA = 0.7  # Relevance vs. diversity when reranking (1.0 = no MMR diversity)
+SEARCH_MODE = "hybrid"  # dense (embeddings), lexical (BM25 only) or hybrid (reciprocal rank fusion of both)
+RRF_K = 60  # Reciprocal rank fusion constant: higher flattens the contribution of top ranks
+PASSAGE_NEIGHBORS = 1  # memory-search returns each hit with this many neighboring chunks on either side, merged into passages
+RAG_CONTEXT_TOKENS = 1500  # Token budget of the memory context auto-RAG prepends to a user message
+MEMORY_SEARCH_TOKENS = 2000  # Token budget of the results memory-search returns to the model
+QUERY_CACHE_SIZE = 256  # Cached search results (0 = disabled); dropped whenever the store changes
+QUERY_CACHE_SIMILARITY = 0.97  # Reuse results for a query embedding at least this similar to a cached one
+ANN_INDEX_ENABLED = True  # Use an IVF index instead of a full scan on large stores
+ANN_MIN_ROWS = 20000  # Below this many chunks a full scan is fast enough
+ANN_NLIST = 0  # IVF lists (k-means centroids); 0 = about 4 * sqrt(rows)
+ANN_NPROBE = 16  # Lists scanned per query: raise for recall, lower for latency
+EMBEDDING_DTYPE = "float32"  # Stored vector precision: float32, float16 (1/2 memory, ~2x exact scan time) or int8 (~1/4, per-vector scaled)
+PQ_ENABLED = False  # Shortlist candidates with product-quantized codes, then re-score them exactly
+PQ_MIN_ROWS = 20000  # Below this many chunks exact scoring is fast enough
+PQ_SUBVECTORS = 96  # Bytes per row in the PQ index (rounded down to a divisor of the dimension)
+PQ_RESCORE_CANDIDATES = 256  # PQ shortlist size re-scored against the stored vectors
+COARSE_SEARCH_DIMENSIONS = 0  # Shortlist on this many leading dimensions first (e.g. 256); 0 = off
+COARSE_RESCORE_CANDIDATES = 256  # Coarse shortlist size re-scored at full dimension
+TOMBSTONE_PURGE_RATIO = 0.2  # Physically drop deleted rows once they exceed this share of the store
+JOURNAL_COMPACT_RECORDS = 2000  # Fold the journal into a new snapshot after this many records
+JOURNAL_FSYNC = False  # fsync every journal record (durable across power loss, slower)
+
+# Document summaries
+SUMMARY_MODE = "lazy"  # lazy (generated on first request, e.g. fetch-youtube-transcript) or background (queued after ingestion); content_type search filters only match summarized documents
+SUMMARY_MODEL = "gpt-4"  # Model for summaries requested on demand
+SUMMARY_BACKGROUND_MODEL = "gpt-4o-mini"  # Cheaper model for queued background summaries
+SUMMARY_QUEUE_SIZE = 100  # Max queued background summaries per store; beyond this documents are summarized on demand
+SUMMARY_INPUT_CHARS = 1000  # Leading characters of a document sent for summarization
+
+# Retention (applied in the background to every loaded store; off unless configured)
+# Limits are per store: the shared store and each tenant shard apply them separately, so with tenant
+# sharding the total across stores can exceed them. Policies map a source name, "prefix*" or "*" to
+# max_age_days (since last retrieved, else stored) and/or max_chunks (over all sources matched). Chunks
+# stored before retention was enabled have no retrieval time yet, so their age counts from when they
+# were stored. Example:
+#   RETENTION_POLICIES = {
+#       "assistant_answer": {"max_age_days": 30, "max_chunks": 5000},
+#       "youtube_transcript_*": {"max_age_days": 180},
+#       "file_*": {},  # Saved files: only the byte cap
+#       "*": {"max_age_days": 14},  # Everything else, e.g. oversized tool results stored under the tool's name
+#   }
+RETENTION_POLICIES = {}  # No policies: nothing is evicted by age or chunk count
+RETENTION_MAX_BYTES_PER_STORE = 0  # Cap on stored vectors + text in each store (not a total), e.g. 1024 ** 3; least recently retrieved chunks go first (0 = no cap)
+RETENTION_INTERVAL_SECONDS = 600  # How often the background compactor applies retention and unloads idle shards
+
+# Tenant shards
+TENANT_SHARDING = True  # Give each signed-in user a private store; anonymous sessions use the shared store
+TENANTS_DIR = os.path.join(KNOWLEDGE_REPO_DIR, "tenants")  # One sub-directory per tenant shard
+TENANT_IDLE_SECONDS = 1800  # Unload a tenant shard from memory after this long without access
+MAX_LOADED_TENANTS = 32  # Max tenant shards kept in memory (least recently used are unloaded first)
+TENANT_SEARCH_WORKERS = 4  # Threads searching the shared and private shards in parallel
+
+# Offloading from the event loop
+OFFLOAD_MODE = "thread"  # Awaitable store calls run blocking work on: thread (pool), process (tokenization in worker processes, the rest on threads) or inline
+OFFLOAD_WORKERS = 4  # Size of the offload thread and process pools
 
 # API Keys
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
@@ -0,0 +1,102 @@
+import time
+import numpy as np
+from typing import List, Optional
+
+from src.database.embedding_matrix import EmbeddingMatrix
+
+
+class IVFIndex:
+    """
+    Inverted-file ANN index over an EmbeddingMatrix.
+
+    Rows are clustered around spherical k-means centroids; a query only scores
+    the rows of the nprobe lists whose centroids are closest to it. New rows are
+    assigned incrementally. Tombstoned rows are filtered by the caller; purges
+    shift row numbers, so they mark the index stale and it is rebuilt lazily
+    on the next search.
+    """
+
+    def __init__(self, nprobe: int, nlist: int = 0, iterations: int = 10, seed: int = 0):
+        self.nprobe = nprobe
+        self.nlist = nlist
+        self.iterations = iterations
+        self.seed = seed
+        self.centroids: Optional[np.ndarray] = None
+        self._lists: List[np.ndarray] = []
+        self._pending: List[List[int]] = []
+        self._rows = 0
+        self._trained_rows = 0
+        self._stale = True
+
+    def __len__(self) -> int:
+        return self._rows
+
+    def needs_rebuild(self, rows: int) -> bool:
+        """Stale after purges, or after the store has doubled since the centroids were trained."""
+        return self._stale or rows != self._rows or rows > 2 * self._trained_rows
+
+    def invalidate(self):
+        self._stale = True
+
+    def build(self, matrix: EmbeddingMatrix):
+        """Train centroids on a sample of the rows and assign every row to its nearest list."""
+        start = time.time()
+        rows = len(matrix)
+        nlist = self.nlist or max(1, int(4 * np.sqrt(rows)))
+        nlist = min(nlist, rows)
+
+        rng = np.random.default_rng(self.seed)
+        sample_size = min(rows, max(nlist * 16, 4096))
+        sample = matrix.take(np.sort(rng.choice(rows, sample_size, replace=False)))
+        self.centroids = self._train(sample, nlist, rng)
+
+        assignments = np.concatenate([self._assign(block) for block in matrix.blocks()])
+        order = np.argsort(assignments, kind="stable")
+        bounds = np.searchsorted(assignments[order], np.arange(nlist + 1))
+        self._lists = [order[bounds[i]:bounds[i + 1]] for i in range(nlist)]
+        self._pending = [[] for _ in range(nlist)]
+        self._rows = rows
+        self._trained_rows = rows
+        self._stale = False
+        print(f"[ANN] Built IVF index: {rows} rows, {nlist} lists in {time.time() - start:.2f}s")
+
+    def add(self, row: int, vector: np.ndarray):
+        """Assign one newly appended (normalized) row to its nearest list."""
+        if self._stale or self.centroids is None or row != self._rows:
+            self._stale = True
+            return
+        self._pending[int(self._assign(vector[np.newaxis, :])[0])].append(row)
+        self._rows += 1
+
+    def candidates(self, query: np.ndarray, nprobe: Optional[int] = None) -> np.ndarray:
+        """Rows in the nprobe lists closest to the (normalized) query, in ascending order."""
+        nprobe = min(nprobe or self.nprobe, len(self._lists))
+        centroid_scores = self.centroids @ query
+        probe = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        parts = [self._lists[i] for i in probe]
+        parts += [np.asarray(self._pending[i], dtype=np.int64) for i in probe if self._pending[i]]
+        return np.sort(np.concatenate(parts)) if parts else np.empty(0, dtype=np.int64)
+
+    def _assign(self, vectors: np.ndarray) -> np.ndarray:
+        return self._assign_to(vectors, self.centroids)
+
+    def _train(self, sample: np.ndarray, nlist: int, rng: np.random.Generator) -> np.ndarray:
+        """Spherical k-means: centroids are re-normalized means of their members."""
+        centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+        for _ in range(self.iterations):
+            assignments = self._assign_to(sample, centroids)
+            counts = np.bincount(assignments, minlength=nlist)
+            starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+            filled = np.flatnonzero(counts)
+            sums = np.zeros_like(centroids)
+            sums[filled] = np.add.reduceat(sample[np.argsort(assignments, kind="stable")], starts[filled], axis=0)
+            empty = np.flatnonzero(counts == 0)
+            if len(empty):
+                # Re-seed empty lists with random sample points
+                sums[empty] = sample[rng.choice(len(sample), len(empty), replace=False)]
+            centroids = EmbeddingMatrix.normalize(sums)
+        return centroids
+
+    @staticmethod
+    def _assign_to(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+        return np.argmax(vectors @ centroids.T, axis=1)
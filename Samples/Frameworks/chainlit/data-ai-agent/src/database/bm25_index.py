@@ -0,0 +1,306 @@
+import os
+import re
+import json
+import numpy as np
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from src.database.embedding_matrix import EmbeddingMatrix, load_rows
+
+_TOKEN = re.compile(r"[\w-]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-cased word tokens; identifiers such as youtube_transcript_<id> stay whole."""
+    return _TOKEN.findall(text.lower())
+
+
+class BM25Snapshot(NamedTuple):
+    """Point-in-time state of a BM25Index for saving alongside a store snapshot."""
+
+    version: int
+    rows: int  # Store rows covered (the snapshot's row count)
+    documents: int
+    vocab: Dict[str, int]
+    terms: List[str]
+    offsets: np.ndarray
+    base: np.ndarray
+    postings: Dict[str, Dict[int, int]]
+    lengths: np.ndarray
+
+
+class BM25Base(NamedTuple):
+    """Saved postings in CSR form: term i owns base[offsets[i]:offsets[i + 1]], (row, tf) pairs by row."""
+
+    rows: int
+    documents: int
+    terms: List[str]
+    vocab: Dict[str, int]
+    offsets: np.ndarray
+    base: np.ndarray
+
+
+class BM25Index:
+    """
+    Inverted index over chunk texts and their meta.source, scored with BM25.
+
+    Postings live in two layers: a read-only base saved with the store
+    snapshot (memory-mapped on load, so nothing is re-tokenized) and
+    in-memory postings {term: {row: tf}} for rows added since. Removing a
+    base row only zeroes its length; postings of zero-length rows are
+    skipped. A purge renumbers rows with remapped().
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._vocab: Dict[str, int] = {}  # base term -> index into _offsets
+        self._base_terms: List[str] = []
+        self._offsets = np.zeros(1, dtype=np.int64)
+        self._base = np.zeros((0, 2), dtype=np.int32)
+        self._base_rows = 0  # Rows below this have their postings in the base
+        self._postings: Dict[str, Dict[int, int]] = defaultdict(dict)
+        self._lengths = np.zeros(0, dtype=np.int32)
+        self._total_length = 0
+        self._documents = 0
+        # Bumped whenever rows are renumbered or dropped, so saved snapshots can detect stale layouts
+        self.version = 0
+
+    def __len__(self) -> int:
+        return self._documents
+
+    @staticmethod
+    def _terms(entry: Dict[str, Any]) -> Counter:
+        return Counter(tokenize(entry.get("text", "")) + tokenize(entry.get("meta", {}).get("source", "")))
+
+    def add(self, row: int, entry: Dict[str, Any]):
+        terms = self._terms(entry)
+        for term, count in terms.items():
+            self._postings[term][row] = count
+        if row >= len(self._lengths):
+            self._lengths = self._grow(self._lengths, max(row + 1, 2 * len(self._lengths), 64))
+        length = sum(terms.values())
+        self._lengths[row] = length
+        self._total_length += length
+        self._documents += 1
+
+    def remove(self, row: int, entry: Dict[str, Any]):
+        if row >= self._base_rows:
+            for term in self._terms(entry):
+                postings = self._postings.get(term)
+                if postings is not None:
+                    postings.pop(row, None)
+                    if not postings:
+                        del self._postings[term]
+        self._total_length -= int(self._lengths[row])
+        self._lengths[row] = 0
+        self._documents -= 1
+
+    def clear(self):
+        version = self.version
+        self.__init__(self.k1, self.b)
+        self.version = version + 1
+
+    def _term_postings(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Rows containing the term (removed rows excluded) and its frequency in each."""
+        rows_parts, tf_parts = [], []
+        index = self._vocab.get(term)
+        if index is not None:
+            block = self._base[self._offsets[index]:self._offsets[index + 1]]
+            block = block[self._lengths[block[:, 0]] > 0]
+            rows_parts.append(block[:, 0].astype(np.int64))
+            tf_parts.append(block[:, 1].astype(np.float32))
+        postings = self._postings.get(term)
+        if postings:
+            rows_parts.append(np.fromiter(postings.keys(), dtype=np.int64, count=len(postings)))
+            tf_parts.append(np.fromiter(postings.values(), dtype=np.float32, count=len(postings)))
+        if not rows_parts:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        return np.concatenate(rows_parts), np.concatenate(tf_parts)
+
+    def _idf(self, postings: int) -> float:
+        return float(np.log(1.0 + (self._documents - postings + 0.5) / (postings + 0.5)))
+
+    def max_score(self, query: str) -> float:
+        """
+        Upper bound of any row's score for the query (every term matched at
+        saturating frequency). Dividing by it puts scores on a 0-1 scale that is
+        comparable across indexes, unlike dividing by the best hit.
+        """
+        terms = set(tokenize(query))
+        return sum(self._idf(len(self._term_postings(term)[0])) for term in terms) * (self.k1 + 1.0)
+
+    def search(self, query: str, k: int, allowed: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        The k best-scoring rows for the query terms, best first, with their BM25
+        scores. With an allowed mask, other rows are dropped before ranking.
+        """
+        hits = [postings for postings in map(self._term_postings, set(tokenize(query))) if len(postings[0])]
+        if not hits or k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        average_length = self._total_length / max(self._documents, 1)
+        rows_parts, score_parts = [], []
+        for rows, tf in hits:
+            idf = self._idf(len(rows))
+            if allowed is not None:
+                keep = allowed[rows]
+                rows, tf = rows[keep], tf[keep]
+            norm = self.k1 * (1.0 - self.b + self.b * self._lengths[rows] / average_length)
+            rows_parts.append(rows)
+            score_parts.append(idf * tf * (self.k1 + 1.0) / (tf + norm))
+
+        rows, inverse = np.unique(np.concatenate(rows_parts), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(score_parts)).astype(np.float32)
+        best = EmbeddingMatrix.top_k(scores, k)
+        return rows[best], scores[best]
+
+    def remapped(self, mapping: np.ndarray) -> "BM25Index":
+        """
+        A copy with rows renumbered after a purge: mapping[old row] is the new
+        row, or -1 for a dropped row. Rows keep their order, so base postings
+        are filtered and renumbered instead of re-tokenizing the entries. This
+        index is left as is (e.g. for searches in progress).
+        """
+        rows = len(mapping)
+        index = BM25Index(self.k1, self.b)
+        term_ids = np.repeat(np.arange(len(self._offsets) - 1), np.diff(self._offsets))
+        base = np.asarray(self._base)
+        new_rows = mapping[base[:, 0]]
+        keep = (new_rows >= 0) & (self._lengths[base[:, 0]] > 0)
+        counts = np.bincount(term_ids[keep], minlength=len(self._offsets) - 1)
+        index._vocab, index._base_terms = self._vocab, self._base_terms
+        index._offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        index._base = np.column_stack([new_rows[keep], base[keep, 1]]).astype(np.int32)
+        index._base_rows = int((mapping[:self._base_rows] >= 0).sum())
+        index._postings = defaultdict(dict, {
+            term: {int(mapping[row]): tf for row, tf in postings.items()}
+            for term, postings in self._postings.items()
+        })
+        kept = mapping >= 0
+        old_lengths = self._lengths if len(self._lengths) >= rows else self._grow(self._lengths, rows)
+        index._lengths = np.zeros(max(int(kept.sum()), 64), dtype=np.int32)
+        index._lengths[mapping[kept]] = old_lengths[:rows][kept]
+        index._total_length = self._total_length
+        index._documents = self._documents
+        index.version = self.version + 1
+        return index
+
+    def snapshot(self, rows: int) -> BM25Snapshot:
+        """State covering the first `rows` rows; only the in-memory postings are copied."""
+        return BM25Snapshot(
+            version=self.version,
+            rows=rows,
+            documents=self._documents,
+            vocab=self._vocab,
+            terms=self._base_terms,
+            offsets=self._offsets,
+            base=self._base,
+            postings={term: dict(postings) for term, postings in self._postings.items()},
+            lengths=self._lengths[:rows].copy(),
+        )
+
+    @staticmethod
+    def save(snapshot: BM25Snapshot, postings_path: str, terms_path: str):
+        """Merge a snapshot's base and in-memory postings into CSR files (live rows only), atomically."""
+        terms = list(snapshot.terms)
+        added: Dict[str, int] = {}
+        ids, rows, tfs = [], [], []
+        for term, postings in snapshot.postings.items():
+            index = snapshot.vocab.get(term)
+            if index is None:
+                index = added.setdefault(term, len(terms) + len(added))
+            ids.extend([index] * len(postings))
+            rows.extend(postings.keys())
+            tfs.extend(postings.values())
+        terms.extend(added)
+
+        base = np.asarray(snapshot.base)
+        term_ids = np.concatenate([
+            np.repeat(np.arange(len(snapshot.offsets) - 1), np.diff(snapshot.offsets)),
+            np.asarray(ids, dtype=np.int64),
+        ])
+        pairs = np.concatenate([base, np.column_stack([rows, tfs]).astype(np.int32).reshape(-1, 2)])
+        live = snapshot.lengths[pairs[:, 0]] > 0
+        term_ids, pairs = term_ids[live], pairs[live]
+        order = np.lexsort((pairs[:, 0], term_ids))
+        term_ids, pairs = term_ids[order], pairs[order]
+        counts = np.bincount(term_ids, minlength=len(terms))
+        present = counts > 0
+
+        tmp_path = f"{postings_path}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, pairs)
+        os.replace(tmp_path, postings_path)
+        tmp_path = f"{terms_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "rows": snapshot.rows,
+                "documents": snapshot.documents,
+                "terms": [term for term, keep in zip(terms, present) if keep],
+                "offsets": np.concatenate([[0], np.cumsum(counts[present])]).tolist(),
+            }, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, terms_path)
+
+    @staticmethod
+    def load_base(postings_path: str, terms_path: str) -> Optional[BM25Base]:
+        """Saved postings, memory-mapped (None if the snapshot has none, e.g. written before they were saved)."""
+        if not os.path.exists(postings_path) or not os.path.exists(terms_path):
+            return None
+        try:
+            with open(terms_path, "r", encoding="utf-8") as f:
+                header = json.load(f)
+            return BM25Base(
+                rows=header["rows"],
+                documents=header["documents"],
+                terms=header["terms"],
+                vocab={term: i for i, term in enumerate(header["terms"])},
+                offsets=np.asarray(header["offsets"], dtype=np.int64),
+                base=load_rows(postings_path).reshape(-1, 2),
+            )
+        except Exception as e:
+            print(f"[WARN] Failed loading BM25 postings {postings_path}: {e}")
+            return None
+
+    @classmethod
+    def load(cls, postings_path: str, terms_path: str, rows: int) -> Optional["BM25Index"]:
+        """An index over saved postings for a store of `rows` rows (None if missing or saved for other rows)."""
+        saved = cls.load_base(postings_path, terms_path)
+        if saved is None or saved.rows != rows:
+            return None
+        index = cls()
+        index._install(saved)
+        index._lengths = np.bincount(saved.base[:, 0], weights=saved.base[:, 1], minlength=max(rows, 64)).astype(np.int32)
+        index._total_length = int(index._lengths.sum())
+        index._documents = saved.documents
+        return index
+
+    def rebase(self, snapshot: BM25Snapshot, saved: BM25Base) -> bool:
+        """
+        Serve the postings a snapshot saved from its memory-mapped files, keeping
+        in memory only rows added after it. Skipped if rows have been renumbered
+        since the snapshot was taken.
+        """
+        if snapshot.version != self.version or saved.rows != snapshot.rows:
+            return False
+        newer: Dict[str, Dict[int, int]] = defaultdict(dict)
+        for term, postings in self._postings.items():
+            kept = {row: tf for row, tf in postings.items() if row >= saved.rows}
+            if kept:
+                newer[term] = kept
+        self._install(saved)
+        self._postings = newer
+        return True
+
+    def _install(self, saved: BM25Base):
+        self._base_terms = saved.terms
+        self._vocab = saved.vocab
+        self._offsets = saved.offsets
+        self._base = saved.base
+        self._base_rows = saved.rows
+
+    @staticmethod
+    def _grow(column: np.ndarray, capacity: int) -> np.ndarray:
+        grown = np.zeros(capacity, dtype=column.dtype)
+        grown[:len(column)] = column
+        return grown
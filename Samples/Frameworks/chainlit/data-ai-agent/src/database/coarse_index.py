@@ -0,0 +1,60 @@
+import time
+import numpy as np
+from typing import Optional
+
+from src.database.embedding_matrix import EmbeddingMatrix
+
+
+class TruncatedIndex:
+    """
+    Coarse shortlist over the leading `dims` components of every row.
+
+    text-embedding-3 vectors are Matryoshka-trained: a re-normalized prefix is
+    itself a usable (lower-fidelity) embedding. Queries scan the short prefixes
+    and only the best `rescore` rows are handed back to be scored at full
+    dimension. Like IVFIndex it is built lazily, extends itself on appends and
+    is rebuilt after purges.
+    """
+
+    def __init__(self, dims: int, rescore: int):
+        self.dims = dims
+        self.rescore = rescore
+        self._prefixes = EmbeddingMatrix()
+        self._stale = True
+
+    def __len__(self) -> int:
+        return len(self._prefixes)
+
+    def needs_rebuild(self, rows: int) -> bool:
+        return self._stale or rows != len(self._prefixes)
+
+    def invalidate(self):
+        self._stale = True
+
+    def build(self, matrix: EmbeddingMatrix):
+        start = time.time()
+        self._prefixes = EmbeddingMatrix(codec=matrix.codec)
+        for block in matrix.blocks():
+            self._prefixes.append(block[:, :self.dims])
+        self._stale = False
+        print(f"[ANN] Built {self.dims}-dim coarse index: {len(matrix)} rows in {time.time() - start:.2f}s")
+
+    def add(self, row: int, vector: np.ndarray):
+        """Append the prefix of one newly appended (normalized) row."""
+        if self._stale or row != len(self._prefixes):
+            self._stale = True
+            return
+        self._prefixes.append(vector[:self.dims])
+
+    def shortlist(self, query: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        The `rescore` rows (of rows, or of all rows) whose prefixes score best
+        against the query prefix, in ascending row order.
+        """
+        prefix = query[:self.dims]
+        if rows is None:
+            scores = self._prefixes.scores(prefix)
+        else:
+            scores = self._prefixes.scores_for(prefix, rows)
+        best = np.sort(np.asarray(EmbeddingMatrix.top_k(scores, self.rescore), dtype=np.int64))
+        return best if rows is None else rows[best]
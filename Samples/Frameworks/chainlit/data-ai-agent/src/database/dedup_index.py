@@ -0,0 +1,89 @@
+from collections import defaultdict
+from typing import Any, Dict, Optional, Set
+
+from src.utils.hashing import hamming_distance
+
+
+class DedupIndex:
+    """
+    In-memory duplicate detection over stored chunks.
+
+    Exact duplicates are found through stable content digests of whole documents
+    (meta.doc_hash) and of chunks (text_hash). Near duplicates are found through
+    chunk SimHash fingerprints, bucketed by 16-bit bands: any two fingerprints
+    within 3 bits of each other share at least one band (pigeonhole), so a
+    lookup only compares against the fingerprints in four buckets.
+    """
+
+    BANDS = 4
+    BAND_BITS = 16
+
+    def __init__(self, max_hamming: int):
+        self.max_hamming = min(max_hamming, self.BANDS - 1)
+        self._documents: Dict[str, int] = defaultdict(int)
+        self._chunks: Dict[str, int] = defaultdict(int)
+        self._fingerprints: Dict[int, int] = defaultdict(int)
+        self._buckets = [defaultdict(set) for _ in range(self.BANDS)]
+
+    def add(self, entry: Dict[str, Any]):
+        doc_hash = entry.get("meta", {}).get("doc_hash")
+        if doc_hash:
+            self._documents[doc_hash] += 1
+        if entry.get("text_hash"):
+            self._chunks[entry["text_hash"]] += 1
+        fingerprint = entry.get("simhash")
+        if fingerprint is not None:
+            self._fingerprints[fingerprint] += 1
+            for band, bucket in self._bands(fingerprint):
+                self._buckets[band][bucket].add(fingerprint)
+
+    def remove(self, entry: Dict[str, Any]):
+        self._decrement(self._documents, entry.get("meta", {}).get("doc_hash"))
+        self._decrement(self._chunks, entry.get("text_hash"))
+        fingerprint = entry.get("simhash")
+        if fingerprint is not None and self._decrement(self._fingerprints, fingerprint):
+            for band, bucket in self._bands(fingerprint):
+                members = self._buckets[band][bucket]
+                members.discard(fingerprint)
+                if not members:
+                    del self._buckets[band][bucket]
+
+    def clear(self):
+        self._documents.clear()
+        self._chunks.clear()
+        self._fingerprints.clear()
+        for buckets in self._buckets:
+            buckets.clear()
+
+    def has_document(self, doc_hash: str) -> bool:
+        return doc_hash in self._documents
+
+    def has_chunk(self, text_hash: str) -> bool:
+        return text_hash in self._chunks
+
+    def near_duplicate(self, fingerprint: int, extra: Optional[Set[int]] = None) -> bool:
+        """Whether a stored fingerprint (or one in extra) is within max_hamming bits."""
+        if self.max_hamming <= 0:
+            return fingerprint in self._fingerprints or bool(extra and fingerprint in extra)
+        candidates = set()
+        for band, bucket in self._bands(fingerprint):
+            candidates |= self._buckets[band].get(bucket, set())
+        if extra:
+            candidates |= extra
+        return any(hamming_distance(fingerprint, other) <= self.max_hamming for other in candidates)
+
+    def _bands(self, fingerprint: int):
+        mask = (1 << self.BAND_BITS) - 1
+        for band in range(self.BANDS):
+            yield band, (fingerprint >> (band * self.BAND_BITS)) & mask
+
+    @staticmethod
+    def _decrement(counts: Dict[Any, int], key) -> bool:
+        """Decrement a refcount; True if the key is now gone."""
+        if key is None or key not in counts:
+            return False
+        counts[key] -= 1
+        if counts[key] <= 0:
+            del counts[key]
+            return True
+        return False
@@ -0,0 +1,235 @@
+import re
+import time
+import asyncio
+import hashlib
+import threading
+import openai
+import numpy as np
+from abc import ABC, abstractmethod
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.config.settings import (
+    PRIMARY_EMBED_MODEL,
+    FALLBACK_EMBED_MODEL,
+    EMBED_MAX_CONCURRENCY,
+    HASHING_EMBED_DIM,
+)
+from src.utils.hashing import content_hash
+from src.utils.offload import run_blocking
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def _on_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
+
+
+class Embedder(ABC):
+    """
+    Embedding provider. embed() / embed_async() take a batch of texts and return
+    one float32 vector per text (None where embedding failed).
+
+    Requests are coalesced: a text already being embedded by another caller
+    (another thread, session or tenant shard) waits for that call instead of
+    sending its own. Subclasses implement _embed (and optionally _embed_async).
+    """
+
+    name = "base"
+
+    def __init__(self):
+        self._inflight: Dict[Tuple[str, Optional[int]], Future] = {}
+        self._lock = threading.Lock()
+        self.requested = 0  # Texts sent to the provider
+        self.coalesced = 0  # Texts served by another caller's in-flight request
+
+    @abstractmethod
+    def _embed(self, texts: List[str], dimensions: Optional[int]) -> List[Optional[np.ndarray]]:
+        """One provider request for texts: a vector per text, None where it failed."""
+
+    async def _embed_async(self, texts: List[str], dimensions: Optional[int]) -> List[Optional[np.ndarray]]:
+        return await run_blocking(self._embed, texts, dimensions)
+
+    def embed(self, texts: List[str], dimensions: Optional[int] = None) -> List[Optional[np.ndarray]]:
+        # On the event loop thread, blocking on a request the loop itself owns would deadlock
+        owned, futures = self._claim(texts, dimensions, wait=not _on_event_loop())
+        results = None
+        try:
+            if owned:
+                results = self._embed(list(owned), dimensions)
+        finally:
+            self._settle(owned, dimensions, results)
+        return [futures[text].result() for text in texts]
+
+    async def embed_async(self, texts: List[str], dimensions: Optional[int] = None) -> List[Optional[np.ndarray]]:
+        owned, futures = self._claim(texts, dimensions, wait=True)
+        results = None
+        try:
+            if owned:
+                results = await self._embed_async(list(owned), dimensions)
+        finally:
+            self._settle(owned, dimensions, results)
+        return [await asyncio.wrap_future(futures[text]) for text in texts]
+
+    def _claim(self, texts: List[str], dimensions: Optional[int],
+               wait: bool) -> Tuple[Dict[str, Future], Dict[str, Future]]:
+        """
+        Split texts into those this caller must request (registered as in flight)
+        and those already in flight elsewhere. Returns (owned, every text's future).
+        """
+        owned: Dict[str, Future] = {}
+        futures: Dict[str, Future] = {}
+        with self._lock:
+            for text in texts:
+                if text in futures:
+                    continue
+                key = (content_hash(text), dimensions)
+                pending = self._inflight.get(key)
+                if pending is not None and wait:
+                    futures[text] = pending
+                    self.coalesced += 1
+                    continue
+                future = Future()
+                if pending is None:
+                    self._inflight[key] = future
+                owned[text] = future
+                futures[text] = future
+            self.requested += len(owned)
+        return owned, futures
+
+    def _settle(self, owned: Dict[str, Future], dimensions: Optional[int],
+                results: Optional[List[Optional[np.ndarray]]]):
+        """Publish results to waiting callers (None for every text if the request raised)."""
+        with self._lock:
+            for text, future in owned.items():
+                key = (content_hash(text), dimensions)
+                if self._inflight.get(key) is future:
+                    del self._inflight[key]
+        results = results if results is not None else [None] * len(owned)
+        for future, result in zip(owned.values(), results):
+            future.set_result(result)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"provider": self.name, "requested": self.requested, "coalesced": self.coalesced}
+
+
+class OpenAIEmbedder(Embedder):
+    """OpenAI embeddings API: each model in turn, with retries and exponential backoff."""
+
+    name = "openai"
+
+    def __init__(self, models: List[str], max_retries: int = 3, max_concurrency: int = EMBED_MAX_CONCURRENCY):
+        super().__init__()
+        self.models = list(dict.fromkeys(models))  # a fallback equal to the primary is tried once
+        self.max_retries = max_retries
+        self.max_concurrency = max_concurrency
+        self._async_client: Optional[openai.AsyncOpenAI] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    @staticmethod
+    def _options(model_name: str, dimensions: Optional[int]) -> Dict[str, Any]:
+        """text-embedding-3 models return shortened (Matryoshka) vectors when asked."""
+        if dimensions and model_name.startswith("text-embedding-3"):
+            return {"dimensions": dimensions}
+        return {}
+
+    @staticmethod
+    def _parse(resp, count: int) -> List[Optional[np.ndarray]]:
+        embeddings: List[Optional[np.ndarray]] = [None] * count
+        for item in resp.data:
+            embeddings[item.index] = np.asarray(item.embedding, dtype=np.float32)
+        return embeddings
+
+    def _embed(self, texts: List[str], dimensions: Optional[int]) -> List[Optional[np.ndarray]]:
+        for attempt in range(self.max_retries):
+            for model_name in self.models:
+                try:
+                    print(f"[EMBED] Batch of {len(texts)}: attempt {attempt + 1}/{self.max_retries} with model={model_name}...")
+                    resp = openai.embeddings.create(input=texts, model=model_name, **self._options(model_name, dimensions))
+                    return self._parse(resp, len(texts))
+                except Exception as e:
+                    print(f"[EMBED] Batch failed with {model_name} (attempt {attempt + 1}): {e}")
+                    time.sleep(min(2 ** attempt, 8))  # Exponential backoff
+
+        print(f"[EMBED] Batch of {len(texts)} failed")
+        return [None] * len(texts)
+
+    async def _embed_async(self, texts: List[str], dimensions: Optional[int]) -> List[Optional[np.ndarray]]:
+        """At most max_concurrency requests in flight across every store using this embedder."""
+        if self._async_client is None:
+            self._async_client = openai.AsyncOpenAI()
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            for attempt in range(self.max_retries):
+                for model_name in self.models:
+                    try:
+                        print(f"[EMBED] Async batch of {len(texts)}: attempt {attempt + 1}/{self.max_retries} with model={model_name}...")
+                        resp = await self._async_client.embeddings.create(
+                            input=texts, model=model_name, **self._options(model_name, dimensions)
+                        )
+                        return self._parse(resp, len(texts))
+                    except Exception as e:
+                        print(f"[EMBED] Async batch failed with {model_name} (attempt {attempt + 1}): {e}")
+                        await asyncio.sleep(min(2 ** attempt, 8))  # Exponential backoff
+        return [None] * len(texts)
+
+
+class HashingEmbedder(Embedder):
+    """
+    Deterministic local embeddings: signed feature hashing of word unigrams and
+    bigrams into `dim` buckets. Texts sharing words get similar vectors, with no
+    network access or model files, which is enough for tests and offline
+    benchmarks of the store (not for real semantic retrieval).
+    """
+
+    name = "hashing"
+
+    def __init__(self, dim: int):
+        super().__init__()
+        self.dim = dim
+
+    def _embed(self, texts: List[str], dimensions: Optional[int]) -> List[Optional[np.ndarray]]:
+        dim = dimensions or self.dim
+        return [self._vector(text, dim) for text in texts]
+
+    async def _embed_async(self, texts: List[str], dimensions: Optional[int]) -> List[Optional[np.ndarray]]:
+        return self._embed(texts, dimensions)
+
+    @staticmethod
+    def _vector(text: str, dim: int) -> np.ndarray:
+        words = _WORD_RE.findall(text.lower())
+        features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+        vector = np.zeros(dim, dtype=np.float32)
+        if not features:
+            return vector
+        hashes = np.fromiter(
+            (int.from_bytes(hashlib.blake2b(f.encode("utf-8"), digest_size=8).digest(), "little") for f in features),
+            dtype=np.uint64,
+            count=len(features),
+        )
+        signs = np.where(hashes >> np.uint64(63), -1.0, 1.0).astype(np.float32)
+        np.add.at(vector, (hashes % np.uint64(dim)).astype(np.int64), signs)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+
+_EMBEDDERS: Dict[str, Embedder] = {}
+_EMBEDDERS_LOCK = threading.Lock()
+
+
+def get_embedder(name: str) -> Embedder:
+    """The shared embedder for a provider name; sharing it lets requests coalesce across stores."""
+    with _EMBEDDERS_LOCK:
+        if name not in _EMBEDDERS:
+            if name == "openai":
+                _EMBEDDERS[name] = OpenAIEmbedder([PRIMARY_EMBED_MODEL, FALLBACK_EMBED_MODEL])
+            elif name == "hashing":
+                _EMBEDDERS[name] = HashingEmbedder(HASHING_EMBED_DIM)
+            else:
+                raise ValueError(f"Unknown embedder {name!r}; expected one of ['hashing', 'openai']")
+        return _EMBEDDERS[name]
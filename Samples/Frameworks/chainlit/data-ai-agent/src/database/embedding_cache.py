@@ -0,0 +1,111 @@
+import threading
+import numpy as np
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from src.utils.hashing import content_hash
+
+
+class EmbeddingCache:
+    """
+    LRU cache of embeddings keyed by a content hash of the text.
+
+    Bounded both by entry count and by the bytes held in vectors; the least
+    recently used entries are evicted first. Keeps hit/miss/eviction counters.
+    Lookups reorder the LRU, so every access takes an internal lock.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, text: str) -> bool:
+        return content_hash(text) in self._entries
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        """Look up text, marking it most recently used."""
+        key = content_hash(text)
+        with self._lock:
+            embedding = self._entries.get(key)
+            if embedding is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return embedding
+
+    def peek(self, text: str) -> Optional[np.ndarray]:
+        """Look up text without touching recency or counters."""
+        return self._entries.get(content_hash(text))
+
+    def put(self, text: str, embedding: np.ndarray) -> str:
+        """Cache an embedding for text; returns its key."""
+        key = content_hash(text)
+        self.put_key(key, embedding)
+        return key
+
+    def put_key(self, key: str, embedding: np.ndarray):
+        """Cache an embedding under an already-hashed key (used when loading/replaying)."""
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = embedding
+            self._bytes += embedding.nbytes
+            self._evict()
+
+    def discard(self, text: str):
+        with self._lock:
+            self._remove(content_hash(text))
+
+    def rebind(self, key: str, embedding: np.ndarray):
+        """Swap the stored array for an equal one (e.g. a memory-mapped row), keeping recency."""
+        with self._lock:
+            if key in self._entries:
+                self._bytes += embedding.nbytes - self._entries[key].nbytes
+                self._entries[key] = embedding
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def items(self) -> Iterator[Tuple[str, np.ndarray]]:
+        """(key, embedding) pairs from least to most recently used."""
+        with self._lock:
+            return iter(list(self._entries.items()))
+
+    def hot_items(self, limit: int) -> List[Tuple[str, np.ndarray]]:
+        """The `limit` most recently used entries, still ordered least to most recent."""
+        with self._lock:
+            items = list(self._entries.items())
+        return items[-limit:] if limit else []
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def _remove(self, key: str):
+        embedding = self._entries.pop(key, None)
+        if embedding is not None:
+            self._bytes -= embedding.nbytes
+
+    def _evict(self):
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            _, embedding = self._entries.popitem(last=False)
+            self._bytes -= embedding.nbytes
+            self.evictions += 1
@@ -0,0 +1,268 @@
+import os
+import numpy as np
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from src.database.quantization import Float32Codec, codec_for
+
+BLOCK_ROWS = 8192  # Rows decoded/scored at a time, bounding temporaries for compressed rows
+
+
+def write_rows(path: str, rows: Iterable[np.ndarray], count: int, dim: int,
+               layout: Optional[Tuple[Tuple[int, ...], np.dtype]] = None) -> None:
+    """
+    Stream rows into a .npy file atomically, without building the full matrix in RAM.
+    Rows are float32 vectors unless a codec layout (shape, dtype) is given.
+    """
+    shape, dtype = layout or ((count, dim), np.dtype(np.float32))
+    tmp_path = f"{path}.tmp"
+    out = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=dtype, shape=shape)
+    written = 0
+    for block in rows:
+        block = np.asarray(block, dtype=dtype).reshape((-1,) + shape[1:])
+        out[written:written + len(block)] = block
+        written += len(block)
+    if written != count:
+        del out
+        os.remove(tmp_path)
+        raise ValueError(f"Expected {count} rows for {path}, got {written}")
+    out.flush()
+    del out
+    os.replace(tmp_path, path)
+
+
+def load_rows(path: str) -> np.ndarray:
+    """Open a .npy file of rows memory-mapped read-only."""
+    try:
+        return np.load(path, mmap_mode="r")
+    except ValueError:
+        # Empty arrays cannot be memory-mapped
+        return np.load(path)
+
+
+class EmbeddingMatrix:
+    """
+    Matrix of L2-normalized embeddings, row-aligned with the vector DB.
+
+    Rows live in two segments: a read-only base (usually memory-mapped from the
+    on-disk snapshot) and an in-memory tail that new embeddings are appended to.
+    Rows are held in the codec's encoding (float32, float16 or scaled int8);
+    take() and blocks() decode to float32. Deleted rows are tombstoned in an
+    alive mask so row numbers stay stable until purge() drops them physically.
+    """
+
+    def __init__(self, dim: Optional[int] = None, codec: Optional[Float32Codec] = None):
+        self.dim: Optional[int] = dim
+        self.codec = codec or Float32Codec()
+        self._base = self.codec.empty(0, dim or 0)
+        self._tail = self.codec.empty(0, dim or 0)
+        self._tail_size = 0
+        self._alive = np.ones(0, dtype=bool)
+        # Bumped whenever existing rows move (keep/clear), so snapshots can detect stale layouts
+        self.version = 0
+
+    def __len__(self) -> int:
+        return len(self._base) + self._tail_size
+
+    @property
+    def alive(self) -> np.ndarray:
+        """Boolean mask of rows that have not been tombstoned (view, no copy)."""
+        return self._alive[:len(self)]
+
+    @property
+    def dead_count(self) -> int:
+        return len(self) - int(self.alive.sum())
+
+    def tombstone(self, rows: Sequence[int]) -> None:
+        self._alive[np.asarray(rows, dtype=np.int64)] = False
+
+    def purge(self) -> None:
+        """Physically drop tombstoned rows (row numbers after them shift down)."""
+        self.keep(self.alive.copy())
+
+    def purged(self) -> "EmbeddingMatrix":
+        """A new matrix without the tombstoned rows; this one is left as is (e.g. for searches in progress)."""
+        return self.kept(self.alive.copy())
+
+    @property
+    def segments(self) -> List[np.ndarray]:
+        """Non-empty segments of encoded rows in order (views, no copy)."""
+        return [seg for seg in (self._base, self._tail[:self._tail_size]) if len(seg)]
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes of encoded rows (the base may be memory-mapped rather than resident)."""
+        return sum(seg.nbytes for seg in self.segments)
+
+    def blocks(self, size: int = BLOCK_ROWS) -> Iterator[np.ndarray]:
+        """All rows in order as decoded float32 blocks of at most size rows."""
+        for segment in self.segments:
+            for start in range(0, len(segment), size):
+                yield self.codec.decode(segment[start:start + size])
+
+    @staticmethod
+    def normalize(vectors: np.ndarray) -> np.ndarray:
+        """L2-normalize vectors row-wise, leaving near-zero rows as zeros."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        single = vectors.ndim == 1
+        if single:
+            vectors = vectors[np.newaxis, :]
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        out = np.zeros_like(vectors)
+        np.divide(vectors, norms, out=out, where=norms >= 1e-9)
+        return out[0] if single else out
+
+    def append(self, vectors: Sequence[Sequence[float]]) -> None:
+        """Normalize and append embeddings to the tail, growing it geometrically."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.size == 0:
+            return
+        if vectors.ndim == 1:
+            vectors = vectors[np.newaxis, :]
+        if self.dim is None or (len(self) == 0 and vectors.shape[1] != self.dim):
+            self.dim = vectors.shape[1]
+            self._base = self.codec.empty(0, self.dim)
+            self._tail = self.codec.empty(0, self.dim)
+        if vectors.shape[1] != self.dim:
+            raise ValueError(f"Embedding dimension mismatch: {vectors.shape[1]} vs {self.dim}")
+
+        needed = self._tail_size + len(vectors)
+        if needed > len(self._tail):
+            capacity = max(needed, 2 * len(self._tail), 64)
+            grown = self.codec.empty(capacity, self.dim)
+            grown[:self._tail_size] = self._tail[:self._tail_size]
+            self._tail = grown
+        self._tail[self._tail_size:needed] = self.codec.encode(self.normalize(vectors))
+        self._tail_size = needed
+        if len(self) > len(self._alive):
+            alive = np.ones(max(len(self), 2 * len(self._alive), 64), dtype=bool)
+            alive[:len(self._alive)] = self._alive
+            self._alive = alive
+
+    def keep(self, mask: np.ndarray) -> None:
+        """Keep only the rows where mask is True (mask is aligned with current rows)."""
+        kept = self.kept(mask)
+        self._base, self._tail, self._tail_size, self._alive = kept._base, kept._tail, 0, kept._alive
+        self.version = kept.version
+
+    def kept(self, mask: np.ndarray) -> "EmbeddingMatrix":
+        """A new matrix of the rows where mask is True (mask is aligned with current rows)."""
+        mask = np.asarray(mask, dtype=bool)
+        split = len(self._base)
+        parts = [self._base[mask[:split]], self._tail[:self._tail_size][mask[split:]]]
+        matrix = EmbeddingMatrix(self.dim, self.codec)
+        matrix._base = np.ascontiguousarray(np.concatenate(parts))
+        matrix._alive = np.ones(len(matrix._base), dtype=bool)
+        matrix.version = self.version + 1
+        return matrix
+
+    def truncate(self, dim: int) -> None:
+        """
+        Keep the leading dim components of every row, re-normalized. For
+        Matryoshka embeddings (text-embedding-3) this equals requesting dim
+        dimensions from the API.
+        """
+        truncated = self.codec.empty(len(self), dim)
+        written = 0
+        for block in self.blocks():
+            truncated[written:written + len(block)] = self.codec.encode(self.normalize(block[:, :dim]))
+            written += len(block)
+        self.dim = dim
+        self._base = truncated
+        self._tail = self.codec.empty(0, dim)
+        self._tail_size = 0
+        self.version += 1
+
+    def clear(self) -> None:
+        self._base = self.codec.empty(0, self.dim or 0)
+        self._tail = self.codec.empty(0, self.dim or 0)
+        self._tail_size = 0
+        self._alive = np.ones(0, dtype=bool)
+        self.version += 1
+
+    def take(self, rows: np.ndarray) -> np.ndarray:
+        """Gather the given rows (ascending row numbers) as decoded float32 vectors."""
+        return self.codec.decode(self._take_encoded(rows))
+
+    def _take_encoded(self, rows: np.ndarray) -> np.ndarray:
+        rows = np.asarray(rows, dtype=np.int64)
+        split = np.searchsorted(rows, len(self._base))
+        parts = [self._base[rows[:split]], self._tail[rows[split:] - len(self._base)]]
+        return np.concatenate(parts) if len(rows) else self.codec.empty(0, self.dim or 0)
+
+    def scores(self, query: Sequence[float]) -> np.ndarray:
+        """Cosine similarity of the query against every row, one product per block of rows."""
+        if len(self) == 0:
+            return np.empty(0, dtype=np.float32)
+        query = self.normalize(np.asarray(query, dtype=np.float32))
+        if query.shape[0] != self.dim:
+            print(f"[ERROR] Embedding dimension mismatch: {query.shape[0]} vs {self.dim}")
+            return np.zeros(len(self), dtype=np.float32)
+        return np.concatenate([
+            self.codec.scores(segment[start:start + BLOCK_ROWS], query)
+            for segment in self.segments
+            for start in range(0, len(segment), BLOCK_ROWS)
+        ])
+
+    def scores_for(self, query: Sequence[float], rows: np.ndarray) -> np.ndarray:
+        """Cosine similarity of the query against a subset of rows (ascending row numbers)."""
+        query = self.normalize(np.asarray(query, dtype=np.float32))
+        if query.shape[0] != self.dim:
+            print(f"[ERROR] Embedding dimension mismatch: {query.shape[0]} vs {self.dim}")
+            return np.zeros(len(rows), dtype=np.float32)
+        return self.codec.scores(self._take_encoded(rows), query)
+
+    @staticmethod
+    def top_k(scores: np.ndarray, k: int, candidates: Optional[np.ndarray] = None) -> List[int]:
+        """Indices of the k best scores (optionally restricted to candidate rows), best first."""
+        if candidates is None:
+            candidates = np.arange(len(scores))
+        if k <= 0 or len(candidates) == 0:
+            return []
+        candidate_scores = scores[candidates]
+        if k < len(candidates):
+            part = np.argpartition(-candidate_scores, k - 1)[:k]
+        else:
+            part = np.arange(len(candidates))
+        order = part[np.argsort(-candidate_scores[part], kind="stable")]
+        return candidates[order].tolist()
+
+    def rebase(self, base: np.ndarray, version: int) -> bool:
+        """
+        Replace the leading rows with base (a freshly written, memory-mapped snapshot
+        of those same rows). Skipped if rows have moved since version was read.
+        """
+        if version != self.version or len(base) > len(self):
+            return False
+        split = len(self._base)
+        tail = self._tail[:self._tail_size]
+        if len(base) >= split:
+            rest = tail[len(base) - split:]
+        else:
+            rest = np.concatenate([self._base[len(base):], tail])
+        self._base = base
+        self._tail = np.array(rest)
+        self._tail_size = len(self._tail)
+        return True
+
+    @classmethod
+    def load(cls, path: str, codec: Optional[Float32Codec] = None) -> "EmbeddingMatrix":
+        """
+        Open a .npy snapshot without reading it into memory. A snapshot written with
+        another codec is re-encoded into memory; the next snapshot stores it natively.
+        """
+        matrix = cls(codec=codec)
+        if os.path.exists(path):
+            base = load_rows(path)
+            stored = codec_for(base)
+            matrix.dim = stored.dim_of(base)
+            if stored.name != matrix.codec.name:
+                print(f"[INIT] Converting {len(base)} stored vectors from {stored.name} to {matrix.codec.name}")
+                converted = matrix.codec.empty(len(base), matrix.dim)
+                for start in range(0, len(base), BLOCK_ROWS):
+                    block = stored.decode(base[start:start + BLOCK_ROWS])
+                    converted[start:start + len(block)] = matrix.codec.encode(block)
+                base = converted
+            matrix._base = base
+            matrix._tail = matrix.codec.empty(0, matrix.dim)
+            matrix._alive = np.ones(len(base), dtype=bool)
+        return matrix
@@ -0,0 +1,68 @@
+import os
+import json
+import base64
+import numpy as np
+from typing import Any, Dict, Iterator, Optional
+
+
+def generation_path(path: str, generation: int) -> str:
+    """Name of a snapshot/journal file for a generation (generation 0 keeps the plain name)."""
+    if generation == 0:
+        return path
+    directory, name = os.path.split(path)
+    stem, _, rest = name.partition(".")
+    return os.path.join(directory, f"{stem}-{generation:06d}.{rest}")
+
+
+def encode_vector(vector: np.ndarray) -> str:
+    """Encode a float32 vector losslessly as base64 for a JSON record."""
+    return base64.b64encode(np.asarray(vector, dtype=np.float32).tobytes()).decode("ascii")
+
+
+def decode_vector(data: str) -> np.ndarray:
+    return np.frombuffer(base64.b64decode(data), dtype=np.float32)
+
+
+class Journal:
+    """Append-only JSONL log of store mutations made since the last snapshot."""
+
+    def __init__(self, path: str, fsync: bool = False):
+        self.path = path
+        self.fsync = fsync
+        self.records = 0
+        self._file = None
+
+    def append(self, record: Dict[str, Any]):
+        if self._file is None:
+            self._file = open(self.path, "a", encoding="utf-8")
+        self._file.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        self.records += 1
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def remove(self):
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    @staticmethod
+    def read(path: str) -> Iterator[Dict[str, Any]]:
+        """Yield records in order, stopping at a torn final line left by a crash."""
+        if not os.path.exists(path):
+            return
+        with open(path, "r", encoding="utf-8") as f:
+            for line_no, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    record: Optional[Dict[str, Any]] = json.loads(line)
+                except json.JSONDecodeError:
+                    print(f"[WARN] Ignoring truncated journal record at {path}:{line_no}")
+                    return
+                yield record
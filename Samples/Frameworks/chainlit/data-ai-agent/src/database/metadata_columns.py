@@ -0,0 +1,95 @@
+import numpy as np
+from typing import Any, Dict, Iterable, Optional
+
+FILTER_KEYS = ("source", "exclude_source", "content_type", "exclude_content_type", "since", "until")
+
+
+class MetadataColumns:
+    """
+    Row-aligned metadata columns (meta.source, meta.content_type, timestamp) so
+    search filters evaluate as vectorized masks before any similarity scoring.
+
+    String fields are dictionary-encoded as int32 codes (0 = missing). Rows are
+    written by row number; tombstoned rows keep their values and are masked out
+    by the caller, and a purge rebuilds the columns from the entries.
+    """
+
+    FIELDS = ("source", "content_type")
+
+    def __init__(self):
+        self._codes = {field: np.zeros(0, dtype=np.int32) for field in self.FIELDS}
+        self._vocab: Dict[str, Dict[str, int]] = {field: {} for field in self.FIELDS}
+        self._timestamps = np.zeros(0, dtype=np.float64)
+        self._rows = 0
+
+    def __len__(self) -> int:
+        return self._rows
+
+    def add(self, row: int, entry: Dict[str, Any]):
+        if row >= len(self._timestamps):
+            capacity = max(row + 1, 2 * len(self._timestamps), 64)
+            for field in self.FIELDS:
+                self._codes[field] = self._grow(self._codes[field], capacity)
+            self._timestamps = self._grow(self._timestamps, capacity)
+        meta = entry.get("meta", {})
+        for field in self.FIELDS:
+            value = meta.get(field)
+            vocab = self._vocab[field]
+            self._codes[field][row] = vocab.setdefault(value, len(vocab) + 1) if value is not None else 0
+        self._timestamps[row] = entry.get("timestamp", 0.0)
+        self._rows = max(self._rows, row + 1)
+
+    def clear(self):
+        self.__init__()
+
+    def mask(self, filters: Dict[str, Any], rows: int) -> np.ndarray:
+        """
+        Boolean mask over the first `rows` rows of those matching every filter:
+        source / content_type (a value or list of values), exclude_source /
+        exclude_content_type, and since / until (Unix timestamps, inclusive).
+
+        content_type comes from document summaries, so it is only set once a
+        document has been summarized: with SUMMARY_MODE="lazy" that is only
+        documents someone asked a summary for (e.g. YouTube transcripts), and a
+        content_type filter never matches the rest (exclude_content_type keeps them).
+        """
+        unknown = set(filters) - set(FILTER_KEYS)
+        if unknown:
+            raise ValueError(f"Unknown search filter(s) {sorted(unknown)}; expected {FILTER_KEYS}")
+
+        mask = np.ones(rows, dtype=bool)
+        n = min(rows, self._rows)
+        mask[n:] = False
+        for field in self.FIELDS:
+            codes = self._codes[field][:n]
+            if filters.get(field) is not None:
+                mask[:n] &= np.isin(codes, self._lookup(field, filters[field]))
+            if filters.get(f"exclude_{field}") is not None:
+                mask[:n] &= ~np.isin(codes, self._lookup(field, filters[f"exclude_{field}"]))
+        if filters.get("since") is not None:
+            mask[:n] &= self._timestamps[:n] >= filters["since"]
+        if filters.get("until") is not None:
+            mask[:n] &= self._timestamps[:n] <= filters["until"]
+        return mask
+
+    def _lookup(self, field: str, values: Any) -> np.ndarray:
+        if isinstance(values, str) or not isinstance(values, Iterable):
+            values = [values]
+        vocab = self._vocab[field]
+        return np.array([vocab[v] for v in values if v in vocab], dtype=np.int32)
+
+    @staticmethod
+    def _grow(column: np.ndarray, capacity: int) -> np.ndarray:
+        grown = np.zeros(capacity, dtype=column.dtype)
+        grown[:len(column)] = column
+        return grown
+
+
+def filter_key(filters: Optional[Dict[str, Any]]) -> Optional[tuple]:
+    """Hashable form of a filter dict (for cache keys)."""
+    if not filters:
+        return None
+    return tuple(sorted(
+        (key, tuple(sorted(value)) if isinstance(value, (list, tuple, set)) else value)
+        for key, value in filters.items()
+    ))
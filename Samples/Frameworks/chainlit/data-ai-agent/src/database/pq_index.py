@@ -0,0 +1,121 @@
+import time
+import numpy as np
+from typing import Optional
+
+from src.database.embedding_matrix import EmbeddingMatrix
+
+
+class PQIndex:
+    """
+    Product-quantization shortlist over an EmbeddingMatrix.
+
+    Each vector is split into `subvectors` slices and every slice is replaced by
+    the id of its nearest of 256 centroids, so a row costs one byte per slice.
+    Queries are scored against the codes with per-slice lookup tables and only
+    the best `rescore` rows are handed back to be scored exactly. Like IVFIndex
+    it is built lazily, assigns appended rows incrementally and is rebuilt after
+    purges.
+    """
+
+    CENTROIDS = 256
+
+    def __init__(self, subvectors: int, rescore: int, iterations: int = 8, seed: int = 0):
+        self.subvectors = subvectors
+        self.rescore = rescore
+        self.iterations = iterations
+        self.seed = seed
+        self.codebooks: Optional[np.ndarray] = None  # (subvectors, 256, slice width)
+        self._codes = np.empty((0, 0), dtype=np.uint8)
+        self._rows = 0
+        self._trained_rows = 0
+        self._stale = True
+
+    def __len__(self) -> int:
+        return self._rows
+
+    def needs_rebuild(self, rows: int) -> bool:
+        """Stale after purges, or after the store has doubled since the codebooks were trained."""
+        return self._stale or rows != self._rows or rows > 2 * self._trained_rows
+
+    def invalidate(self):
+        self._stale = True
+
+    def build(self, matrix: EmbeddingMatrix):
+        """Train per-slice codebooks on a sample of the rows and encode every row."""
+        start = time.time()
+        rows = len(matrix)
+        m = self._slices(matrix.dim)
+        rng = np.random.default_rng(self.seed)
+        sample_size = min(rows, self.CENTROIDS * 32)
+        sample = matrix.take(np.sort(rng.choice(rows, sample_size, replace=False)))
+        sample = sample.reshape(len(sample), m, -1)
+        self.codebooks = np.stack([self._train(np.ascontiguousarray(sample[:, j]), rng) for j in range(m)])
+
+        self._codes = np.empty((max(rows, 64), m), dtype=np.uint8)
+        written = 0
+        for block in matrix.blocks():
+            self._codes[written:written + len(block)] = self._encode(block)
+            written += len(block)
+        self._rows = rows
+        self._trained_rows = rows
+        self._stale = False
+        print(f"[ANN] Built PQ index: {rows} rows, {m} bytes/row in {time.time() - start:.2f}s")
+
+    def add(self, row: int, vector: np.ndarray):
+        """Encode one newly appended (normalized) row."""
+        if self._stale or self.codebooks is None or row != self._rows:
+            self._stale = True
+            return
+        if row >= len(self._codes):
+            grown = np.empty((2 * len(self._codes), self._codes.shape[1]), dtype=np.uint8)
+            grown[:row] = self._codes[:row]
+            self._codes = grown
+        self._codes[row] = self._encode(vector[np.newaxis, :])[0]
+        self._rows += 1
+
+    def shortlist(self, query: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        The `rescore` rows (of rows, or of all rows) with the best approximate
+        scores against the (normalized) query, in ascending row order.
+        """
+        codes = self._codes[:self._rows] if rows is None else self._codes[rows]
+        m = len(self.codebooks)
+        # tables[j, c]: dot product of query slice j with centroid c
+        tables = np.einsum("jcd,jd->jc", self.codebooks, query.reshape(m, -1))
+        approx = tables[np.arange(m), codes].sum(axis=1)
+        if len(approx) > self.rescore:
+            best = np.argpartition(-approx, self.rescore - 1)[:self.rescore]
+        else:
+            best = np.arange(len(approx))
+        best = np.sort(best)
+        return best if rows is None else rows[best]
+
+    def _slices(self, dim: int) -> int:
+        """Largest slice count up to `subvectors` that divides dim evenly."""
+        return next(m for m in range(min(self.subvectors, dim), 0, -1) if dim % m == 0)
+
+    def _encode(self, vectors: np.ndarray) -> np.ndarray:
+        m = len(self.codebooks)
+        slices = vectors.reshape(len(vectors), m, -1).transpose(1, 0, 2).copy()
+        return np.stack([self._nearest(slices[j], self.codebooks[j]) for j in range(m)], axis=1).astype(np.uint8)
+
+    def _train(self, sample: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+        """Euclidean k-means over one slice of the sample."""
+        k = min(self.CENTROIDS, len(sample))
+        centroids = sample[rng.choice(len(sample), k, replace=False)].copy()
+        for _ in range(self.iterations):
+            assignments = self._nearest(sample, centroids)
+            counts = np.bincount(assignments, minlength=k)
+            starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+            filled = np.flatnonzero(counts)
+            sums = np.add.reduceat(sample[np.argsort(assignments, kind="stable")], starts[filled], axis=0)
+            centroids[filled] = sums / counts[filled, np.newaxis]
+        if k < self.CENTROIDS:
+            # Tiny stores: pad with unused centroids so codes are always < 256
+            centroids = np.concatenate([centroids, np.repeat(centroids[:1], self.CENTROIDS - k, axis=0)])
+        return centroids
+
+    @staticmethod
+    def _nearest(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+        # argmin ||v - c||^2 == argmax (v.c - ||c||^2 / 2)
+        return np.argmax(vectors @ centroids.T - 0.5 * np.einsum("cd,cd->c", centroids, centroids), axis=1)
@@ -0,0 +1,104 @@
+import re
+import threading
+import numpy as np
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+from src.database.embedding_matrix import EmbeddingMatrix
+
+
+def normalize_query(query: str) -> str:
+    """Case- and whitespace-insensitive form of a query, used as the exact-match key."""
+    return re.sub(r"\s+", " ", query).strip().lower()
+
+
+class QueryCache:
+    """
+    LRU cache of search results for the current store revision.
+
+    Results are found either by normalized query text (before the query is even
+    embedded) or by a cached query embedding whose cosine similarity to the new
+    one is at least `similarity`. Search parameters are part of every key, and
+    the whole cache is dropped as soon as the store revision changes. Shared by
+    concurrent searches, so all access goes through one internal lock.
+    """
+
+    def __init__(self, max_entries: int, similarity: float):
+        self.max_entries = max_entries
+        self.similarity = similarity
+        self.revision: Optional[int] = None
+        # (normalized query, params) -> (normalized query embedding or None, results)
+        self._entries: "OrderedDict[Tuple[str, Hashable], Tuple[Optional[np.ndarray], List[Any]]]" = OrderedDict()
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, query: str, params: Hashable, revision: int) -> Optional[List[Any]]:
+        """Exact lookup by normalized query text."""
+        with self._lock:
+            key = (normalize_query(query), params)
+            entry = self._entries.get(key) if self._sync(revision) else None
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return list(entry[1])
+
+    def get_similar(self, embedding: np.ndarray, params: Hashable, revision: int) -> Optional[List[Any]]:
+        """Lookup by query-embedding proximity among entries with the same parameters."""
+        with self._lock:
+            if not self._sync(revision):
+                keys = []
+            else:
+                keys = [key for key, (cached, _) in self._entries.items() if key[1] == params and cached is not None]
+            if not keys:
+                self.misses += 1
+                return None
+            cached = np.stack([self._entries[key][0] for key in keys])
+            scores = cached @ EmbeddingMatrix.normalize(embedding)
+            best = int(np.argmax(scores))
+            if scores[best] < self.similarity:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(keys[best])
+            self.semantic_hits += 1
+            return list(self._entries[keys[best]][1])
+
+    def put(self, query: str, params: Hashable, revision: int, embedding: Optional[np.ndarray], results: List[Any]):
+        """Cache results; embedding may be None for lookups that never embedded the query."""
+        with self._lock:
+            if self.max_entries <= 0 or not self._sync(revision):
+                return
+            key = (normalize_query(query), params)
+            self._entries[key] = (EmbeddingMatrix.normalize(embedding) if embedding is not None else None, list(results))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.semantic_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.semantic_hits) / lookups if lookups else 0.0,
+        }
+
+    def _sync(self, revision: int) -> bool:
+        """
+        Drop every cached result once a newer store revision is seen. Returns False
+        for a caller still holding an older revision (its results are stale).
+        """
+        if self.revision is None or revision > self.revision:
+            self._entries.clear()
+            self.revision = revision
+        return revision == self.revision
@@ -0,0 +1,64 @@
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+DAY_SECONDS = 24 * 3600
+
+
+def policy_key(source: str, policies: Dict[str, Dict[str, Any]]) -> Optional[str]:
+    """
+    The policy a source falls under: an exact source name, else the longest
+    matching "prefix*" pattern, else "*". None when no policy applies.
+    """
+    if source in policies:
+        return source
+    patterns = [key for key in policies if key.endswith("*") and source.startswith(key[:-1])]
+    return max(patterns, key=len) if patterns else None
+
+
+def last_used(entry: Dict[str, Any]) -> float:
+    """When a chunk was last returned by a search, else when it was stored."""
+    return entry.get("last_hit") or entry.get("timestamp", 0.0)
+
+
+def select_evictions(entries: Iterable[Tuple[int, Dict[str, Any]]], row_bytes: float, now: float,
+                     policies: Dict[str, Dict[str, Any]], max_bytes: int) -> Dict[int, str]:
+    """
+    Rows to evict from (row, entry) pairs of the live entries, with the reason:
+
+    - "age": unused (neither retrieved nor stored) for longer than the policy's max_age_days
+    - "chunks": beyond the policy's max_chunks, counted over every source it covers
+    - "bytes": beyond max_bytes of stored vectors (row_bytes each) plus text for the whole store
+
+    Within the chunk and byte caps, least recently used chunks go first.
+    """
+    evicted: Dict[int, str] = {}
+    groups: Dict[Optional[str], List[Tuple[float, int, int]]] = defaultdict(list)
+    sizes = []
+    for row, entry in entries:
+        key = policy_key(entry["meta"]["source"], policies)
+        used = last_used(entry)
+        max_age_days = policies[key].get("max_age_days") if key is not None else None
+        if max_age_days is not None and now - used > max_age_days * DAY_SECONDS:
+            evicted[row] = "age"
+            continue
+        size = int(row_bytes) + len(entry.get("text", ""))
+        groups[key].append((used, row, size))
+
+    for key, rows in groups.items():
+        max_chunks = policies[key].get("max_chunks") if key is not None else None
+        if max_chunks is not None and len(rows) > max_chunks:
+            rows.sort()
+            for _, row, _ in rows[:len(rows) - max_chunks]:
+                evicted[row] = "chunks"
+            del rows[:len(rows) - max_chunks]
+        sizes.extend(rows)
+
+    total = sum(size for _, _, size in sizes)
+    if max_bytes and total > max_bytes:
+        sizes.sort()
+        for _, row, size in sizes:
+            if total <= max_bytes:
+                break
+            evicted[row] = "bytes"
+            total -= size
+    return evicted
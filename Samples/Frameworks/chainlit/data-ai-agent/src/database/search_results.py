@@ -0,0 +1,68 @@
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from src.utils.tokenizer import count_tokens, truncate_tokens
+
+
+class SearchResult(NamedTuple):
+    """
+    One ranked search hit: a stored chunk or, with neighbors, a passage of
+    consecutive chunks. Refers to the stored text (no embedding is copied).
+    """
+
+    id: str  # Id of the (best) matching chunk
+    score: float  # Final ranking score, relevance in [0, 1] adjusted by reranking
+    source: str
+    doc_hash: Optional[str]
+    chunks: Tuple[int, int]  # First and last chunk_index covered
+    span: Tuple[int, int]  # Token offsets of the text within its document
+    text: str
+    timestamp: Optional[float]
+
+    def provenance(self) -> str:
+        first, last = self.chunks
+        chunks = f"chunk {first}" if first == last else f"chunks {first}-{last}"
+        return f"[{self.source}, {chunks}, score {self.score:.2f}]"
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-friendly form for tool results."""
+        return {
+            "id": self.id,
+            "score": round(self.score, 4),
+            "source": self.source,
+            "chunks": list(self.chunks),
+            "span": list(self.span),
+            "text": self.text,
+        }
+
+
+def assemble_context(results: List[SearchResult], token_budget: int, min_tokens: int = 64,
+                     with_provenance: bool = True) -> Tuple[str, List[SearchResult]]:
+    """
+    Pack results into at most token_budget tokens, highest score first. A
+    result that does not fit is skipped for smaller ones; once no whole result
+    fits, the best remaining one is cut to the leftover budget if at least
+    min_tokens are left. Returns the context text and the results it holds
+    (a cut result with its shortened text).
+    """
+    pieces, packed = [], []
+    remaining = token_budget
+    separator_tokens = 1
+    leftover: Optional[Tuple[SearchResult, str]] = None
+    for result in sorted(results, key=lambda r: -r.score):
+        header = f"{result.provenance()}\n" if with_provenance else ""
+        cost = count_tokens(header + result.text, limit=remaining) + separator_tokens
+        if cost <= remaining:
+            pieces.append(header + result.text)
+            packed.append(result)
+            remaining -= cost
+        elif leftover is None:
+            leftover = (result, header)
+
+    if leftover is not None and remaining >= min_tokens:
+        result, header = leftover
+        # The cut text is followed by " ..." (one token)
+        text = truncate_tokens(result.text, remaining - separator_tokens - count_tokens(header) - 1)
+        if text:
+            pieces.append(header + text + " ...")
+            packed.append(result._replace(text=text))
+    return "\n\n".join(pieces), packed
@@ -0,0 +1,312 @@
+import os
+import re
+import time
+import asyncio
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncContextManager, AsyncIterator, ContextManager, Dict, Iterator, List, Optional, Tuple
+
+from src.config.settings import (
+    KNOWLEDGE_REPO_DIR,
+    TENANT_SHARDING,
+    TENANTS_DIR,
+    TENANT_IDLE_SECONDS,
+    MAX_LOADED_TENANTS,
+    TENANT_SEARCH_WORKERS,
+    RETENTION_INTERVAL_SECONDS,
+    SEARCH_MODE,
+)
+from src.database.search_results import SearchResult
+from src.database.vector_store import VectorStore
+from src.utils.hashing import content_hash
+from src.utils.offload import run_blocking
+
+# Tenant (user id) of the Chainlit session being handled; None = shared store only.
+# Set per message handler; asyncio tasks and to_thread calls inherit it.
+current_tenant: ContextVar[Optional[str]] = ContextVar("current_tenant", default=None)
+
+
+def tenant_directory(tenant: str) -> str:
+    """Filesystem-safe shard directory for a tenant id (the hash suffix keeps sanitized ids distinct)."""
+    safe = re.sub(r"[^\w.-]", "_", tenant)[:48]
+    return os.path.join(TENANTS_DIR, f"{safe}-{content_hash(tenant)[:12]}")
+
+
+class _Shard:
+    """A tenant's entry in the store manager: its store once loaded, and who is using it."""
+
+    def __init__(self, previous: Optional["_Shard"] = None):
+        self.store: Optional[VectorStore] = None
+        self.last_access = time.time()
+        self.leases = 0  # Operations in progress; the shard is only unloaded at zero
+        self.loading = threading.Lock()  # Held while the store loads, outside the manager lock
+        self.previous = previous  # Earlier shard of the tenant still being unloaded
+        self.unloaded = threading.Event()
+
+
+class StoreManager:
+    """
+    Routes memory reads and writes to per-tenant VectorStore shards.
+
+    The shared store (knowledge_repo itself) holds memories visible to every
+    session and is opened on first use, not on import; each tenant gets a private shard under TENANTS_DIR, loaded on first
+    access and unloaded (after a snapshot) once idle for TENANT_IDLE_SECONDS or
+    when more than MAX_LOADED_TENANTS are loaded. Every shard has its own lock,
+    journal and indexes, so one tenant's writes never block another's searches.
+
+    Shards are used through leases (lease(), current(), current_async()): a
+    shard is never unloaded while an operation holds one, and loading or
+    unloading a shard never holds up other tenants.
+    """
+
+    def __init__(self, shared_directory: str = KNOWLEDGE_REPO_DIR):
+        self.shared_directory = shared_directory
+        self._shared: Optional[VectorStore] = None
+        self._shared_loading = threading.Lock()
+        # tenant -> shard, least recently used first
+        self._shards: "OrderedDict[str, _Shard]" = OrderedDict()
+        self._unloading: Dict[str, _Shard] = {}
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._maintenance: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    @property
+    def shared(self) -> VectorStore:
+        """The shared store, loaded on first access."""
+        if self._shared is None:
+            with self._shared_loading:
+                if self._shared is None:
+                    self._shared = VectorStore(self.shared_directory)
+        return self._shared
+
+    @contextmanager
+    def lease(self, tenant: Optional[str] = None) -> Iterator[VectorStore]:
+        """
+        The tenant's shard for the duration of the with block, loading it if
+        needed (the shared store when tenant is None or sharding is off).
+        """
+        if not TENANT_SHARDING or tenant is None:
+            yield self.shared
+            return
+        shard = self._acquire(tenant)
+        try:
+            yield self._resolve(tenant, shard)
+        finally:
+            self._release(shard)
+
+    @asynccontextmanager
+    async def lease_async(self, tenant: Optional[str] = None) -> AsyncIterator[VectorStore]:
+        """lease() for async handlers: a shard that is not loaded yet loads on the offload thread pool."""
+        if not TENANT_SHARDING or tenant is None:
+            yield self._shared if self._shared is not None else await run_blocking(lambda: self.shared)
+            return
+        shard = self._acquire(tenant)
+        try:
+            yield shard.store if shard.store is not None else await run_blocking(self._resolve, tenant, shard)
+        finally:
+            self._release(shard)
+
+    def current(self) -> ContextManager[VectorStore]:
+        """Lease on the store of the session being handled (see current_tenant)."""
+        return self.lease(current_tenant.get())
+
+    def current_async(self) -> AsyncContextManager[VectorStore]:
+        return self.lease_async(current_tenant.get())
+
+    def _acquire(self, tenant: str) -> _Shard:
+        """Register a lease on the tenant's shard (creating its entry); cheap, the store may not be loaded yet."""
+        with self._lock:
+            shard = self._shards.get(tenant)
+            if shard is None:
+                shard = self._shards[tenant] = _Shard(previous=self._unloading.get(tenant))
+            self._shards.move_to_end(tenant)
+            shard.leases += 1
+            shard.last_access = time.time()
+            evicted = self._evictable(keep=tenant)
+        if evicted:
+            # Unloading snapshots the evicted shards; that is no work for this caller
+            threading.Thread(target=self._unload, args=(evicted,), name="shard-unload", daemon=True).start()
+        return shard
+
+    def _resolve(self, tenant: str, shard: _Shard) -> VectorStore:
+        """The shard's store, loading it on first use; concurrent callers for the tenant wait for one load."""
+        with shard.loading:
+            if shard.store is None:
+                if shard.previous is not None:
+                    shard.previous.unloaded.wait()  # Never open a directory another store is still writing
+                print(f"[VDB] Loading shard for tenant={tenant}")
+                shard.store = VectorStore(tenant_directory(tenant))
+        return shard.store
+
+    def _release(self, shard: _Shard):
+        with self._lock:
+            shard.leases -= 1
+            shard.last_access = time.time()
+
+    def evict_idle(self) -> int:
+        """Unload idle shards now; returns how many were unloaded."""
+        with self._lock:
+            evicted = self._evictable()
+        self._unload(evicted)
+        return len(evicted)
+
+    def _evictable(self, keep: Optional[str] = None) -> List[Tuple[str, _Shard]]:
+        """
+        Detach shards past the idle timeout or over the loaded-shard cap (caller
+        holds the lock). Shards with leases, a load in progress or background
+        work are kept.
+        """
+        now = time.time()
+        evicted = []
+        for tenant, shard in list(self._shards.items()):
+            if len(self._shards) <= MAX_LOADED_TENANTS and now - shard.last_access < TENANT_IDLE_SECONDS:
+                break  # ordered by last access, so every later shard is newer
+            if tenant == keep or shard.leases or shard.loading.locked():
+                continue
+            if shard.store is not None and shard.store.busy:
+                continue
+            del self._shards[tenant]
+            if shard.store is None:
+                continue  # Its load was abandoned before it started: nothing to close
+            self._unloading[tenant] = shard
+            evicted.append((tenant, shard))
+        return evicted
+
+    def _unload(self, evicted: List[Tuple[str, _Shard]]):
+        for tenant, shard in evicted:
+            try:
+                shard.store.close()
+                print(f"[VDB] Unloaded idle shard for tenant={tenant}")
+            except Exception as e:
+                print(f"[WARN] Failed unloading shard for tenant={tenant}: {e}")
+            finally:
+                with self._lock:
+                    if self._unloading.get(tenant) is shard:
+                        del self._unloading[tenant]
+                shard.unloaded.set()
+
+    def maintain(self) -> int:
+        """
+        Unload idle shards, then apply retention to every loaded store (each
+        against its own limits); returns how many chunks were evicted.
+        """
+        self.evict_idle()
+        with self._lock:
+            shards = [shard for shard in self._shards.values() if shard.store is not None]
+            for shard in shards:
+                shard.leases += 1
+        evicted = 0
+        try:
+            stores = [self._shared] if self._shared is not None else []
+            for store in stores + [shard.store for shard in shards]:
+                try:
+                    evicted += store.apply_retention()
+                except Exception as e:
+                    print(f"[WARN] Retention failed for store {store.directory}: {e}")
+        finally:
+            with self._lock:
+                for shard in shards:
+                    shard.leases -= 1
+        return evicted
+
+    def start_maintenance(self):
+        """Run maintain() every RETENTION_INTERVAL_SECONDS on a daemon thread (started once per process)."""
+        with self._lock:
+            if self._maintenance is not None:
+                return
+            self._maintenance = threading.Thread(target=self._maintenance_loop, name="store-maintenance", daemon=True)
+            self._maintenance.start()
+
+    def stop_maintenance(self):
+        self._stop.set()
+
+    def _maintenance_loop(self):
+        while not self._stop.wait(RETENTION_INTERVAL_SECONDS):
+            self.maintain()
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=TENANT_SEARCH_WORKERS, thread_name_prefix="shard-search")
+        return self._executor
+
+    def search(self, query: str, top_k: int = 3, tenant: Optional[str] = None,
+               include_shared: bool = True, **kwargs) -> List[str]:
+        """search_with_scores returning the result texts."""
+        return [result.text for result in self.search_with_scores(query, top_k, tenant, include_shared, **kwargs)]
+
+    def search_with_scores(self, query: str, top_k: int = 3, tenant: Optional[str] = None,
+                           include_shared: bool = True, **kwargs) -> List[SearchResult]:
+        """
+        Search the tenant's shard and (with include_shared) the shared store in
+        parallel, merging their results by score. The query is embedded once for
+        both. Without a tenant (default: current_tenant) only the shared store is
+        searched. kwargs go to VectorStore.search (min_similarity, rerank, mode, filters, neighbors).
+        """
+        with self.lease(current_tenant.get() if tenant is None else tenant) as store:
+            if store is self.shared or not include_shared:
+                return store.search_with_scores(query, top_k, **kwargs)
+            if not query:
+                return []
+
+            query_embedding = None
+            if (kwargs.get("mode") or SEARCH_MODE) != "lexical":
+                query_embedding = store.embed_text(query)
+                if query_embedding.size == 0:
+                    return []
+            futures = [
+                self._get_executor().submit(shard.search_with_scores, query, top_k, query_embedding=query_embedding, **kwargs)
+                for shard in (store, self.shared)
+            ]
+            hits = sorted((hit for future in futures for hit in future.result()), key=lambda hit: -hit.score)
+
+        results, seen = [], set()
+        for hit in hits:
+            if hit.text not in seen:
+                seen.add(hit.text)
+                results.append(hit)
+        return results[:top_k]
+
+    async def search_async(self, query: str, top_k: int = 3, **kwargs) -> List[str]:
+        """Awaitable search (including loading the shard) on the offload thread pool."""
+        return await run_blocking(self.search, query, top_k, **kwargs)
+
+    async def search_with_scores_async(self, query: str, top_k: int = 3, **kwargs) -> List[SearchResult]:
+        """Awaitable search_with_scores on the offload thread pool."""
+        return await run_blocking(self.search_with_scores, query, top_k, **kwargs)
+
+    async def add_text_async(self, text: str, source: str):
+        """Store text in the current session's store (see VectorStore.add_text_async)."""
+        async with self.current_async() as store:
+            await store.add_text_async(text, source)
+
+    async def schedule_add_text(self, text: str, source: str) -> asyncio.Task:
+        """
+        Store text in the current session's store in the background (see
+        VectorStore.schedule_add_text); the shard stays loaded until it is stored.
+        """
+        async with self.current_async() as store:
+            return store.schedule_add_text(text, source)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            now = time.time()
+            return {
+                "sharding": TENANT_SHARDING,
+                "loaded_shards": len(self._shards),
+                "shards": {
+                    tenant: {
+                        "entries": shard.store.live_count if shard.store is not None else None,
+                        "leases": shard.leases,
+                        "idle_seconds": round(now - shard.last_access, 1),
+                    }
+                    for tenant, shard in self._shards.items()
+                },
+            }
+
+
+# Initialize global store manager; the shared store in KNOWLEDGE_REPO_DIR opens on first use
+store_manager = StoreManager()
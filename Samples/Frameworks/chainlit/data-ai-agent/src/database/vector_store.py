@@ -1,55 +1,154 @@
 import os
+import re
+import copy
 import json
 import time
+import asyncio
+import queue
+import threading
 import openai
-import tiktoken
 import numpy as np
-from typing import Dict, List, Any, Tuple, Optional
-from collections import defaultdict
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Dict, List, Any, Iterable, Iterator, Set, Tuple, Optional
+from collections import Counter, defaultdict
 
 from src.config.settings import (
     KNOWLEDGE_REPO_DIR,
     EMBED_CACHE_FILE,
     VECTOR_DB_FILE,
+    VECTOR_DB_VECTORS_FILE,
+    VECTOR_DB_META_FILE,
+    EMBED_CACHE_VECTORS_FILE,
+    EMBED_CACHE_KEYS_FILE,
+    SNAPSHOT_MANIFEST_FILE,
+    JOURNAL_FILE,
+    BM25_POSTINGS_FILE,
+    BM25_TERMS_FILE,
     PRIMARY_EMBED_MODEL,
-    FALLBACK_EMBED_MODEL,
     MAX_CACHE_SIZE,
+    MAX_CACHE_BYTES,
+    EMBED_CACHE_PERSIST_ENTRIES,
+    EMBED_BATCH_MAX_INPUTS,
+    EMBED_BATCH_MAX_TOKENS,
+    EMBEDDER,
     CHUNK_SIZE,
     CHUNK_OVERLAP,
     MIN_SIMILARITY,
     DYNAMIC_SIMILARITY,
     MAX_RERANK_CANDIDATES,
+    JOURNAL_COMPACT_RECORDS,
+    JOURNAL_FSYNC,
+    ANN_INDEX_ENABLED,
+    ANN_MIN_ROWS,
+    ANN_NLIST,
+    ANN_NPROBE,
+    NEAR_DUPLICATE_MAX_HAMMING,
+    TOMBSTONE_PURGE_RATIO,
+    RERANK_ENABLED,
+    MMR_LAMBDA,
+    QUERY_CACHE_SIZE,
+    QUERY_CACHE_SIMILARITY,
+    EMBEDDING_DTYPE,
+    PQ_ENABLED,
+    PQ_MIN_ROWS,
+    PQ_SUBVECTORS,
+    PQ_RESCORE_CANDIDATES,
+    EMBED_DIMENSIONS,
+    COARSE_SEARCH_DIMENSIONS,
+    COARSE_RESCORE_CANDIDATES,
+    SEARCH_MODE,
+    RRF_K,
+    RETENTION_POLICIES,
+    RETENTION_MAX_BYTES_PER_STORE,
+    SUMMARY_MODE,
+    SUMMARY_MODEL,
+    SUMMARY_BACKGROUND_MODEL,
+    SUMMARY_QUEUE_SIZE,
+    SUMMARY_INPUT_CHARS,
 )
+from src.database.embedders import get_embedder
+from src.database.embedding_matrix import EmbeddingMatrix, write_rows, load_rows
+from src.database.ann_index import IVFIndex
+from src.database.pq_index import PQIndex
+from src.database.coarse_index import TruncatedIndex
+from src.database.quantization import get_codec
+from src.database.embedding_cache import EmbeddingCache
+from src.database.dedup_index import DedupIndex
+from src.database.bm25_index import BM25Index
+from src.database.metadata_columns import MetadataColumns, filter_key
+from src.database.query_cache import QueryCache
+from src.database.retention import select_evictions
+from src.database.search_results import SearchResult
+from src.database.journal import Journal, generation_path, encode_vector, decode_vector
+from src.utils.hashing import content_hash, simhash
+from src.utils.tokenizer import get_encoding, iter_chunks, join_overlapping, split_chunks
+from src.utils.offload import run_blocking, run_cpu
+from src.utils.rwlock import RWLock
+
+SUMMARY_KEYS = ("summary", "topics", "content_type")
+# Attributes holding the rows and everything indexed by row number, swapped together by a purge
+ROW_STATE = ("vector_db", "embeddings", "bm25", "columns", "dedup", "_id_rows", "_source_rows", "_chunk_rows")
 
 class VectorStore:
-    def __init__(self):
-        self.embed_cache: Dict[str, List[float]] = {}
-        self.vector_db: List[Dict[str, Any]] = []
+    def __init__(self, directory: str = KNOWLEDGE_REPO_DIR):
+        # Snapshot and journal files live here (one directory per store, e.g. per tenant shard)
+        self.directory = directory
+        self.embed_cache = EmbeddingCache(MAX_CACHE_SIZE, MAX_CACHE_BYTES)
+        # Row-aligned with self.embeddings; deleted rows are None (tombstones) until purged
+        self.vector_db: List[Optional[Dict[str, Any]]] = []
+        self._id_rows: Dict[str, List[int]] = defaultdict(list)
+        self._source_rows: Dict[str, List[int]] = defaultdict(list)
+        # (source, doc_hash) -> {chunk_index: row}, for expanding hits to neighboring chunks
+        self._chunk_rows: Dict[Tuple[str, Optional[str]], Dict[int, int]] = defaultdict(dict)
         self.embedding_dim: Optional[int] = None
+        self.codec = get_codec(EMBEDDING_DTYPE)
+        self.embeddings = EmbeddingMatrix(codec=self.codec)
+        self.ann: Optional[IVFIndex] = IVFIndex(nprobe=ANN_NPROBE, nlist=ANN_NLIST) if ANN_INDEX_ENABLED else None
+        self.pq: Optional[PQIndex] = PQIndex(PQ_SUBVECTORS, PQ_RESCORE_CANDIDATES) if PQ_ENABLED else None
+        self.coarse: Optional[TruncatedIndex] = (
+            TruncatedIndex(COARSE_SEARCH_DIMENSIONS, COARSE_RESCORE_CANDIDATES) if COARSE_SEARCH_DIMENSIONS else None
+        )
+        self.dedup = DedupIndex(NEAR_DUPLICATE_MAX_HAMMING)
+        self.bm25 = BM25Index()
+        self.columns = MetadataColumns()
+        # Bumped on every change to the stored rows; cached search results are only valid for one revision
+        self.revision = 0
+        self.query_cache = QueryCache(QUERY_CACHE_SIZE, QUERY_CACHE_SIMILARITY)
+        self.generation = 0
+        self.journal = Journal(self._path(JOURNAL_FILE), JOURNAL_FSYNC)
+        # Writes (appends, deletes, compaction swaps) are exclusive; searches share the read side
+        self._lock = RWLock()
+        # Serializes writers (see _writing); held alone while a purge is built, so searches continue
+        self._write_mutex = threading.RLock()
+        # doc_hashes of documents being ingested right now (claimed under _write_mutex)
+        self._ingesting: Set[str] = set()
+        # Serializes journal appends and journal swaps
+        self._journal_lock = threading.Lock()
+        # Serializes lazy ANN/PQ/coarse index builds between concurrent searches
+        self._index_lock = threading.Lock()
+        self._compacting = False
+        self.embedder = get_embedder(EMBEDDER)
+        # doc_hash -> summary metadata, computed on first need (see get_summary)
+        self.summaries: Dict[str, Dict[str, str]] = {}
+        self._summary_futures: Dict[str, Future] = {}
+        self._summary_lock = threading.Lock()
+        self._summary_queue: Optional[queue.Queue] = None
+        self._summary_thread: Optional[threading.Thread] = None
+        self._background_tasks = set()
         self.init_store()
 
-    def _validate_embedding(self, embedding: List[float]) -> bool:
+    def _path(self, path: str) -> str:
+        """A knowledge_repo file setting, relocated into this store's directory."""
+        return os.path.join(self.directory, os.path.basename(path))
+
+    def _validate_embedding(self, embedding) -> bool:
         """Validate embedding dimensions and values."""
-        if not embedding or not isinstance(embedding, list):
+        if embedding is None or len(embedding) == 0:
             return False
         if self.embedding_dim and len(embedding) != self.embedding_dim:
             return False
-        return all(isinstance(x, float) for x in embedding)
-
-    def _evict_oldest_entries(self, count: int):
-        """Remove oldest entries from embedding cache."""
-        if len(self.embed_cache) <= count:
-            return
-        
-        # Sort by timestamp if available, otherwise just take random entries
-        sorted_entries = sorted(
-            [(k, self.vector_db.get(k, {}).get('timestamp', 0)) 
-             for k in self.embed_cache.keys()],
-            key=lambda x: x[1]
-        )
-        
-        for key, _ in sorted_entries[:count]:
-            del self.embed_cache[key]
+        return bool(np.isfinite(embedding).all())
 
     def cos_sim(self, a: List[float], b: List[float]) -> float:
         """Calculate cosine similarity with proper validation."""
@@ -72,80 +171,513 @@ class VectorStore:
             print(f"[ERROR] Cosine similarity calculation failed: {e}")
             return 0.0
 
-    def embed_text(self, text: str) -> List[float]:
-        """Return an embedding for text with improved caching and validation."""
+    def embed_text(self, text: str) -> np.ndarray:
+        """Return an embedding for text with improved caching and validation (empty on failure)."""
         if not text.strip():
-            return []
+            return np.empty(0, dtype=np.float32)
             
         # Check cache with validation
-        if text in self.embed_cache:
-            cached_embedding = self.embed_cache[text]
+        cached_embedding = self.embed_cache.get(text)
+        if cached_embedding is not None:
             if self._validate_embedding(cached_embedding):
                 return cached_embedding
-            else:
-                del self.embed_cache[text]
-
-        # Implement cache eviction if needed
-        if len(self.embed_cache) >= MAX_CACHE_SIZE:
-            self._evict_oldest_entries(MAX_CACHE_SIZE // 10)  # Remove 10% oldest entries
-
-        # Try embedding with retries
-        max_retries = 3
-        for attempt in range(max_retries):
-            for model_name in [PRIMARY_EMBED_MODEL, FALLBACK_EMBED_MODEL]:
-                try:
-                    print(f"[EMBED] Attempt {attempt + 1}/{max_retries} with model={model_name}...")
-                    resp = openai.embeddings.create(input=text, model=model_name)
-                    embedding = resp.data[0].embedding
-                    
-                    # Validate and store embedding dimension
-                    if self._validate_embedding(embedding):
-                        if not self.embedding_dim:
-                            self.embedding_dim = len(embedding)
-                        self.embed_cache[text] = embedding
-                        self.save_store()
-                        return embedding
-                except Exception as e:
-                    print(f"[EMBED] Failed with {model_name} (attempt {attempt + 1}): {e}")
-                    time.sleep(min(2 ** attempt, 8))  # Exponential backoff
+            self.embed_cache.discard(text)
+
+        embedding = self.embedder.embed([text], self._embed_dimensions())[0]
+        if embedding is not None and self._cache_embedding(text, embedding):
+            return embedding
 
         print("[EMBED] All embedding attempts failed")
-        return []
+        return np.empty(0, dtype=np.float32)
 
-    def chunk_text(self, text: str) -> List[Tuple[str, int, int]]:
-        """Split text into overlapping chunks with position tracking."""
-        try:
-            enc = tiktoken.encoding_for_model("gpt-4")
-        except:
-            enc = tiktoken.encoding_for_model("gpt-3.5-turbo")
+    def _embed_dimensions(self) -> Optional[int]:
+        """Requested vector size: once the store has a dimension, it is kept."""
+        return self.embedding_dim or EMBED_DIMENSIONS
 
-        tokens = enc.encode(text)
-        chunks = []
-        
-        for i in range(0, len(tokens), CHUNK_SIZE - CHUNK_OVERLAP):
-            chunk_tokens = tokens[i:i + CHUNK_SIZE]
-            chunk_text = enc.decode(chunk_tokens)
-            start_pos = i
-            end_pos = i + len(chunk_tokens)
-            chunks.append((chunk_text, start_pos, end_pos))
-            
-        return chunks
+    def _cache_embedding(self, text: str, embedding: np.ndarray) -> bool:
+        """
+        Validate, record the embedding dimension, and cache the embedding. Not
+        journaled: stored chunks carry their vector in the "add" record, and
+        anything else (e.g. query embeddings) can be requested again; the hot
+        entries reach disk with the next snapshot.
+        """
+        if not self._validate_embedding(embedding):
+            return False
+        if not self.embedding_dim:
+            self.embedding_dim = len(embedding)
+        self.embed_cache.put(text, embedding)
+        return True
+
+    def _embedding_batches(self, texts: List[str]) -> List[List[str]]:
+        """Group texts into request batches bounded by input count and total tokens."""
+        enc = get_encoding(PRIMARY_EMBED_MODEL)
+        batches, batch, batch_tokens = [], [], 0
+        for text in texts:
+            tokens = len(enc.encode(text, disallowed_special=()))
+            if batch and (len(batch) >= EMBED_BATCH_MAX_INPUTS or batch_tokens + tokens > EMBED_BATCH_MAX_TOKENS):
+                batches.append(batch)
+                batch, batch_tokens = [], 0
+            batch.append(text)
+            batch_tokens += tokens
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def _pending_texts(self, texts: List[str]) -> List[str]:
+        """Unique, non-empty texts without a valid cached embedding."""
+        pending = []
+        for text in texts:
+            if not text.strip() or text in pending:
+                continue
+            cached = self.embed_cache.get(text)
+            if cached is not None and self._validate_embedding(cached):
+                continue
+            pending.append(text)
+        return pending
+
+    def _collect_embeddings(self, texts: List[str], resolved: Dict[str, np.ndarray]) -> List[np.ndarray]:
+        empty = np.empty(0, dtype=np.float32)
+        results = []
+        for text in texts:
+            if text in resolved:
+                results.append(resolved[text])
+            elif text.strip() and self.embed_cache.peek(text) is not None:
+                results.append(self.embed_cache.peek(text))
+            else:
+                results.append(empty)
+        return results
+
+    def embed_texts(self, texts: List[str]) -> List[np.ndarray]:
+        """
+        Embed many texts with as few API calls as possible.
+
+        Uncached texts are sent as list inputs in batches; results are mapped back
+        by response index. A batch that keeps failing falls back to embed_text per
+        item. Returns one embedding per input (empty array where embedding failed).
+        """
+        resolved: Dict[str, np.ndarray] = {}
+        for batch in self._pending_batches(texts):
+            embeddings = self._request_embedding_batch(batch)
+            for text, embedding in zip(batch, embeddings):
+                if embedding is not None and self._cache_embedding(text, embedding):
+                    resolved[text] = embedding
+                else:
+                    resolved[text] = self.embed_text(text)
+        return self._collect_embeddings(texts, resolved)
+
+    async def embed_texts_async(self, texts: List[str]) -> List[np.ndarray]:
+        """
+        Async embed_texts: batches are requested concurrently (bounded by the
+        embedder); cache lookups and updates run on the offload thread pool.
+        """
+        batches = await run_blocking(self._pending_batches, texts)
+        results = await asyncio.gather(*(self._request_embedding_batch_async(b) for b in batches))
+        received = [
+            (text, embedding)
+            for batch, embeddings in zip(batches, results)
+            for text, embedding in zip(batch, embeddings)
+        ]
+
+        # Per-item fallback for anything the batches could not embed
+        failed = [text for text, embedding in received if embedding is None]
+        retries = await asyncio.gather(*(self._request_embedding_batch_async([t]) for t in failed))
+        received += [(text, embedding) for text, (embedding,) in zip(failed, retries)]
+        return await run_blocking(self._cache_received, texts, received)
+
+    def _pending_batches(self, texts: List[str]) -> List[List[str]]:
+        return self._embedding_batches(self._pending_texts(texts))
+
+    def _cache_received(self, texts: List[str], received: List[Tuple[str, Optional[np.ndarray]]]) -> List[np.ndarray]:
+        """Cache the embeddings received for texts and return one per text (empty where none is valid)."""
+        resolved: Dict[str, np.ndarray] = {}
+        for text, embedding in received:
+            if embedding is not None and self._cache_embedding(text, embedding):
+                resolved[text] = embedding
+        return self._collect_embeddings(texts, resolved)
+
+    async def _request_embedding_batch_async(self, batch: List[str]) -> List[Optional[np.ndarray]]:
+        """Async _request_embedding_batch; the embedder bounds concurrent requests."""
+        return await self.embedder.embed_async(batch, self._embed_dimensions())
+
+    def _request_embedding_batch(self, batch: List[str]) -> List[Optional[np.ndarray]]:
+        """One embedder call for a batch; None for every item that failed."""
+        return self.embedder.embed(batch, self._embed_dimensions())
+
+    def chunk_text(self, text: str) -> Iterator[Tuple[str, int, int]]:
+        """Stream overlapping chunks with token position tracking, snapped to sentence/paragraph breaks."""
+        return iter_chunks(text, CHUNK_SIZE, CHUNK_OVERLAP)
+
+    async def chunk_text_async(self, text: str) -> List[Tuple[str, int, int]]:
+        """Awaitable chunk_text; tokenization runs off the event loop (in a worker process with OFFLOAD_MODE="process")."""
+        return await run_cpu(split_chunks, text, CHUNK_SIZE, CHUNK_OVERLAP)
 
     def init_store(self):
-        """Load or init knowledge_repo. Then read EMBED_CACHE & VECTOR_DB."""
+        """Load or init knowledge_repo: memory-map the latest snapshot, then replay its journal."""
         try:
-            # Ensure parent directories exist
-            os.makedirs(KNOWLEDGE_REPO_DIR, exist_ok=True)
-            os.makedirs(os.path.dirname(EMBED_CACHE_FILE), exist_ok=True)
-            os.makedirs(os.path.dirname(VECTOR_DB_FILE), exist_ok=True)
-            
-            self.embed_cache = self.load_json(EMBED_CACHE_FILE, {})
-            self.vector_db = self.load_json(VECTOR_DB_FILE, [])
-            print(f"[INIT] EMBED_CACHE size: {len(self.embed_cache)} | VECTOR_DB entries: {len(self.vector_db)}")
+            os.makedirs(self.directory, exist_ok=True)
+
+            manifest = self.load_json(self._path(SNAPSHOT_MANIFEST_FILE), {})
+            self.generation = manifest.get("generation", 0)
+            self._load_snapshot(self.generation, hashed_keys=manifest.get("cache_keys") == "blake2b")
+
+            if not os.path.exists(generation_path(self._path(VECTOR_DB_META_FILE), self.generation)) and (
+                os.path.exists(self._path(VECTOR_DB_FILE)) or os.path.exists(self._path(EMBED_CACHE_FILE))
+            ):
+                self.journal = Journal(generation_path(self._path(JOURNAL_FILE), self.generation), JOURNAL_FSYNC)
+                self._migrate_json_store()
+            else:
+                self._replay_journals()
+            self._apply_embed_dimensions()
+            print(f"[INIT] EMBED_CACHE size: {len(self.embed_cache)} | VECTOR_DB entries: {self.live_count}")
         except Exception as e:
             print(f"[ERROR] Failed to initialize vector store: {e}")
-            self.embed_cache = {}
+            self.embed_cache.clear()
             self.vector_db = []
+            self.embeddings = EmbeddingMatrix(codec=self.codec)
+            self.journal = Journal(generation_path(self._path(JOURNAL_FILE), self.generation), JOURNAL_FSYNC)
+
+    def _load_snapshot(self, generation: int, hashed_keys: bool = True):
+        """Memory-map the snapshot files of a generation."""
+        self.vector_db = self.load_jsonl(generation_path(self._path(VECTOR_DB_META_FILE), generation))
+        self.embeddings = EmbeddingMatrix.load(generation_path(self._path(VECTOR_DB_VECTORS_FILE), generation), self.codec)
+        self.revision += 1
+        self._invalidate_ann()
+        self._reconcile_rows()
+        self.embeddings.tombstone([row for row, entry in enumerate(self.vector_db) if entry is None])
+        bm25 = BM25Index.load(generation_path(self._path(BM25_POSTINGS_FILE), generation),
+                              generation_path(self._path(BM25_TERMS_FILE), generation), len(self.vector_db))
+        if bm25 is not None:
+            self.bm25 = bm25
+        self._rebuild_indexes(bm25=bm25 is None)
+        self.embedding_dim = self.embeddings.dim
+        self._load_embed_cache(generation, hashed_keys)
+
+    def _replay_journals(self):
+        """
+        Crash recovery: apply the snapshot's journal and any newer ones. Newer journals
+        exist only if a compaction was interrupted before its manifest was written.
+        """
+        generation = self.generation
+        replayed = []
+        while os.path.exists(generation_path(self._path(JOURNAL_FILE), generation)):
+            count = 0
+            for record in Journal.read(generation_path(self._path(JOURNAL_FILE), generation)):
+                self._apply_record(record)
+                count += 1
+            replayed.append(count)
+            generation += 1
+
+        if replayed:
+            self.generation = generation - 1
+            print(f"[INIT] Replayed {sum(replayed)} journal records from {len(replayed)} journal(s).")
+        self.journal = Journal(generation_path(self._path(JOURNAL_FILE), self.generation), JOURNAL_FSYNC)
+        self.journal.records = replayed[-1] if replayed else 0
+        if len(replayed) > 1:
+            self.compact()
+
+    def _apply_record(self, record: Dict[str, Any]):
+        """Apply one journal record to the in-memory state (without journaling it again)."""
+        op = record.get("op")
+        if op == "cache":  # written before cached embeddings were left out of the journal
+            if "digest" in record:
+                self.embed_cache.put_key(record["digest"], decode_vector(record["embedding"]))
+            else:  # written before the cache was keyed by content hash
+                self.embed_cache.put(record["key"], decode_vector(record["embedding"]))
+        elif op == "add":
+            embedding = decode_vector(record["embedding"])
+            if not self.embedding_dim:
+                self.embedding_dim = len(embedding)
+            entry = record["entry"]
+            if not isinstance(entry.get("text_hash"), str):
+                entry["text_hash"] = content_hash(entry.get("text", ""))
+            self._append_entry(entry, embedding)
+            self.embed_cache.put_key(entry["text_hash"], embedding)  # as cached when the chunk was embedded
+        elif op == "tombstone":
+            self._tombstone_rows(record["rows"])
+        elif op == "purge":
+            self._purge_tombstones()
+        elif op == "delete":  # written before deletes were tombstoned: rows were removed outright
+            self._tombstone_rows(record["rows"])
+            self._purge_tombstones()
+        elif op == "clear":
+            self._clear_entries()
+        elif op == "summary":
+            self._apply_summary(record["source"], record["doc_hash"], record["summary"])
+        else:
+            print(f"[WARN] Unknown journal record: {op}")
+
+    def _log(self, record: Dict[str, Any]):
+        try:
+            with self._journal_lock:
+                self.journal.append(record)
+        except Exception as e:
+            print(f"[WARN] Failed writing journal record: {e}")
+
+    @contextmanager
+    def _writing(self) -> Iterator[None]:
+        """Exclusive access for a mutation: other writers are kept out first, then searches."""
+        with self._write_mutex, self._lock.write():
+            yield
+
+    def _maybe_compact(self):
+        """Start a background compaction once the journal has grown past the threshold."""
+        if self.journal.records >= JOURNAL_COMPACT_RECORDS:
+            self.compact(background=True)
+
+    def _reconcile_rows(self):
+        """Drop trailing rows if an interrupted save left metadata and vectors out of step."""
+        rows = min(len(self.vector_db), len(self.embeddings))
+        if rows == len(self.vector_db) == len(self.embeddings):
+            return
+        print(f"[WARN] VECTOR_DB has {len(self.vector_db)} entries but {len(self.embeddings)} vectors; keeping {rows}.")
+        self.vector_db = self.vector_db[:rows]
+        if len(self.embeddings) > rows:
+            self.embeddings.keep(np.arange(len(self.embeddings)) < rows)
+
+    def _apply_embed_dimensions(self):
+        """
+        Migrate stored vectors after EMBED_DIMENSIONS was lowered: keep each
+        Matryoshka prefix, re-normalized, and write a new snapshot.
+        """
+        target = EMBED_DIMENSIONS
+        if not target:
+            return
+        stored = self.embeddings.dim
+        if stored and stored < target:
+            print(f"[WARN] Stored embeddings have {stored} dimensions (< EMBED_DIMENSIONS={target}); "
+                  f"keeping {stored} until the store is re-ingested.")
+            return
+        with self._writing():
+            changed = False
+            if stored and stored > target:
+                print(f"[INIT] Truncating {len(self.embeddings)} stored embeddings from {stored} to {target} dimensions")
+                self.embeddings.truncate(target)
+                self.revision += 1
+                self._invalidate_ann()
+                changed = True
+            for key, embedding in self.embed_cache.items():
+                if len(embedding) > target:
+                    self.embed_cache.put_key(key, EmbeddingMatrix.normalize(embedding[:target]))
+                    changed = True
+            self.embedding_dim = self.embeddings.dim or self.embedding_dim
+            if self.embedding_dim and self.embedding_dim > target:
+                self.embedding_dim = target
+        if changed:
+            self.compact()
+
+    def _load_embed_cache(self, generation: int, hashed_keys: bool):
+        """
+        Load the persisted hot cache entries in recency order; the embeddings stay
+        memory-mapped as row views. Older snapshots stored raw texts as keys.
+        """
+        self.embed_cache.clear()
+        keys = self.load_jsonl(generation_path(self._path(EMBED_CACHE_KEYS_FILE), generation))
+        vectors_path = generation_path(self._path(EMBED_CACHE_VECTORS_FILE), generation)
+        if not keys or not os.path.exists(vectors_path):
+            return
+        for key, row in zip(keys, load_rows(vectors_path)):
+            if hashed_keys:
+                self.embed_cache.put_key(key, row)
+            else:
+                self.embed_cache.put(key, row)
+
+    def _migrate_json_store(self):
+        """One-shot migration of the legacy JSON files to the binary format."""
+        self.vector_db = self.load_json(self._path(VECTOR_DB_FILE), [])
+        legacy_cache = self.load_json(self._path(EMBED_CACHE_FILE), {})
+        print(f"[INIT] Migrating {len(self.vector_db)} entries and {len(legacy_cache)} cached embeddings from JSON.")
+
+        self._rebuild_embeddings()
+        for entry in self.vector_db:
+            entry.pop("embedding", None)
+        self._rebuild_indexes()
+        self.embed_cache.clear()
+        for text, embedding in legacy_cache.items():
+            if self._validate_embedding(embedding):
+                self.embed_cache.put(text, np.asarray(embedding, dtype=np.float32))
+        self.save_store()
+
+        for path in (self._path(VECTOR_DB_FILE), self._path(EMBED_CACHE_FILE)):
+            if os.path.exists(path):
+                os.replace(path, f"{path}.migrated")
+
+    def _rebuild_embeddings(self):
+        """Build the normalized embedding matrix from legacy entries carrying inline embeddings."""
+        self.embeddings = EmbeddingMatrix(codec=self.codec)
+        self._invalidate_ann()
+        dims = [len(e["embedding"]) for e in self.vector_db if e.get("embedding")]
+        if not dims:
+            return
+        dim = max(set(dims), key=dims.count)
+        if not self.embedding_dim:
+            self.embedding_dim = dim
+
+        matrix = np.zeros((len(self.vector_db), dim), dtype=np.float32)
+        for row, entry in enumerate(self.vector_db):
+            embedding = entry.get("embedding")
+            if embedding and len(embedding) == dim:
+                matrix[row] = embedding
+            else:
+                print(f"[WARN] Entry {entry.get('id')} has no usable embedding; it will never match.")
+        self.embeddings.append(matrix)
+
+    @property
+    def live_count(self) -> int:
+        """Number of stored (non-tombstoned) entries."""
+        return len(self.vector_db) - self.embeddings.dead_count
+
+    def _live_entries(self) -> List[Dict[str, Any]]:
+        """Snapshot of the stored entries, safe to iterate while writes continue."""
+        with self._lock.read():
+            return [entry for entry in self.vector_db if entry is not None]
+
+    def _rebuild_indexes(self, bm25: bool = True):
+        """
+        Rebuild the id/source row indexes and the dedup index, and with bm25 the
+        BM25 index (otherwise it is kept: loaded with the snapshot, or remapped
+        by a purge). Entries written before digests were stable carry a
+        per-process hash() value, so their text_hash is recomputed here.
+        """
+        self._id_rows.clear()
+        self._source_rows.clear()
+        self._chunk_rows.clear()
+        self.dedup.clear()
+        if bm25:
+            self.bm25.clear()
+        self.columns.clear()
+        for row, entry in enumerate(self.vector_db):
+            if entry is None:
+                continue
+            if not isinstance(entry.get("text_hash"), str):
+                entry["text_hash"] = content_hash(entry.get("text", ""))
+            self._index_entry(row, entry, bm25)
+
+    def _index_entry(self, row: int, entry: Dict[str, Any], bm25: bool = True):
+        self._id_rows[entry["id"]].append(row)
+        self._source_rows[entry["meta"]["source"]].append(row)
+        if entry["meta"].get("doc_hash"):
+            self._chunk_rows[self._document_key(entry)][entry["meta"].get("chunk_index", 0)] = row
+            if entry["meta"].get("content_type") not in (None, "unknown"):
+                self.summaries.setdefault(entry["meta"]["doc_hash"], {key: entry["meta"].get(key) for key in SUMMARY_KEYS})
+        self.dedup.add(entry)
+        if bm25:
+            self.bm25.add(row, entry)
+        self.columns.add(row, entry)
+
+    def _unindex_entry(self, row: int, entry: Dict[str, Any]):
+        for index, key in ((self._id_rows, entry["id"]), (self._source_rows, entry["meta"]["source"])):
+            rows = index.get(key)
+            if rows:
+                rows.remove(row)
+                if not rows:
+                    del index[key]
+        document = self._chunk_rows.get(self._document_key(entry))
+        if document is not None:
+            document.pop(entry["meta"].get("chunk_index", 0), None)
+            if not document:
+                del self._chunk_rows[self._document_key(entry)]
+        self.dedup.remove(entry)
+        self.bm25.remove(row, entry)
+
+    @staticmethod
+    def _document_key(entry: Dict[str, Any]) -> Tuple[str, Optional[str]]:
+        """Chunks of one stored document (a source such as assistant_answer holds many documents)."""
+        return entry["meta"]["source"], entry["meta"].get("doc_hash")
+
+    def _append_entry(self, entry: Dict[str, Any], embedding: np.ndarray):
+        self.revision += 1
+        self.vector_db.append(entry)
+        self._index_entry(len(self.vector_db) - 1, entry)
+        self.embeddings.append(embedding)
+        if self.ann is not None or self.pq is not None or self.coarse is not None:
+            normalized = EmbeddingMatrix.normalize(embedding)
+            for index in (self.ann, self.pq, self.coarse):
+                if index is not None:
+                    index.add(len(self.vector_db) - 1, normalized)
+
+    def _invalidate_ann(self):
+        """Row numbers changed: rebuild the ANN/PQ/coarse indexes lazily on the next search."""
+        for index in (self.ann, self.pq, self.coarse):
+            if index is not None:
+                index.invalidate()
+
+    def _tombstone_rows(self, rows: List[int]):
+        """Mark rows deleted in place; row numbers (and the ANN index) stay valid."""
+        self.revision += 1
+        for row in rows:
+            entry = self.vector_db[row]
+            if entry is not None:
+                self._unindex_entry(row, entry)
+                self.vector_db[row] = None
+        self.embeddings.tombstone(rows)
+
+    def _purge_tombstones(self):
+        """Physically drop tombstoned rows in place (journal replay; nothing else is using the store)."""
+        self._install_rows(self._purged_copy())
+
+    def _purged_copy(self) -> "VectorStore":
+        """
+        A shallow copy of the store without the tombstoned rows: later rows
+        shift, so the BM25 postings are renumbered and the other row indexes
+        rebuilt. Only the copy is modified, so searches can keep using this
+        store meanwhile; the caller holds the write mutex so no writes happen.
+        """
+        alive = self.embeddings.alive
+        mapping = np.where(alive, np.cumsum(alive) - 1, -1)
+        purged = copy.copy(self)
+        purged.vector_db = [entry for entry in self.vector_db if entry is not None]
+        purged.embeddings = self.embeddings.purged()
+        purged.bm25 = self.bm25.remapped(mapping)
+        purged.columns = MetadataColumns()
+        purged.dedup = DedupIndex(NEAR_DUPLICATE_MAX_HAMMING)
+        purged._id_rows, purged._source_rows, purged._chunk_rows = defaultdict(list), defaultdict(list), defaultdict(dict)
+        purged._rebuild_indexes(bm25=False)
+        return purged
+
+    def _install_rows(self, purged: "VectorStore"):
+        """Swap in the rows and row indexes of a purged copy (caller holds the write lock, if needed)."""
+        self.revision += 1
+        for name in ROW_STATE:
+            setattr(self, name, getattr(purged, name))
+        self._invalidate_ann()
+
+    def _clear_entries(self):
+        self.revision += 1
+        self.vector_db = []
+        self._id_rows.clear()
+        self._source_rows.clear()
+        self._chunk_rows.clear()
+        self.summaries.clear()
+        self.dedup.clear()
+        self.bm25.clear()
+        self.columns.clear()
+        self.embeddings.clear()
+        self._invalidate_ann()
+
+    def _delete_rows(self, rows: List[int]) -> int:
+        """
+        Tombstone rows (journaled), purging once tombstones pass TOMBSTONE_PURGE_RATIO.
+        The purged rows are built copy-on-write and swapped in, so searches only
+        wait for the swap. The caller holds the write mutex.
+        """
+        rows = sorted(set(rows))
+        if not rows:
+            return 0
+        with self._writing():
+            self._tombstone_rows(rows)
+            self._log({"op": "tombstone", "rows": rows})
+        if self.embeddings.dead_count > TOMBSTONE_PURGE_RATIO * len(self.vector_db):
+            purged = self._purged_copy()
+            with self._writing():
+                self._install_rows(purged)
+                self._log({"op": "purge"})
+        return len(rows)
+
+    def _filter_entries(self, keep) -> int:
+        """Delete vector_db entries (and their matrix rows) for which keep(entry) is false."""
+        with self._write_mutex:
+            rows = [row for row, entry in enumerate(self.vector_db) if entry is not None and not keep(entry)]
+            return self._delete_rows(rows)
 
     def load_json(self, path: str, default):
         if not os.path.exists(path):
@@ -158,23 +690,146 @@ class VectorStore:
             return default
 
     def save_json(self, path: str, data):
+        """Write a JSON document, replacing the file atomically."""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_path, path)
+
+    def load_jsonl(self, path: str) -> List[Any]:
+        if not os.path.exists(path):
+            return []
         try:
-            with open(path, "w", encoding="utf-8") as f:
-                json.dump(data, f, indent=2)
+            with open(path, "r", encoding="utf-8") as f:
+                return [json.loads(line) for line in f if line.strip()]
         except Exception as e:
-            print(f"[WARN] Failed saving {path}: {e}")
+            print(f"[WARN] Failed loading {path}: {e}")
+            return []
+
+    def save_jsonl(self, path: str, rows):
+        """Write one compact JSON document per line, replacing the file atomically."""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for row in rows:
+                f.write(json.dumps(row, ensure_ascii=False, separators=(",", ":")))
+                f.write("\n")
+        os.replace(tmp_path, path)
 
     def save_store(self):
-        """Save EMBED_CACHE & VECTOR_DB to disk."""
-        self.save_json(EMBED_CACHE_FILE, self.embed_cache)
-        self.save_json(VECTOR_DB_FILE, self.vector_db)
+        """Fold everything into a new snapshot on disk right away."""
+        self.compact()
 
-    def _generate_summary(self, text: str, source: str) -> Dict[str, str]:
-        """Generate a summary and semantic metadata for the text using GPT."""
+    @property
+    def busy(self) -> bool:
+        """True while a compaction, background add or queued summary is still in flight."""
+        summary_queue = self._summary_queue
+        pending_summaries = summary_queue is not None and summary_queue.unfinished_tasks
+        return self._compacting or bool(self._background_tasks) or bool(pending_summaries)
+
+    def close(self):
+        """
+        Stop the summary worker, snapshot any journaled changes and release the
+        journal file (before the store is unloaded).
+        """
+        self._stop_summary_worker()
+        if self.journal.records:
+            self.compact()
+        with self._journal_lock:
+            self.journal.close()
+
+    def compact(self, background: bool = False):
+        """
+        Write the current state as snapshot generation N+1. New mutations go to
+        journal N+1 immediately; the manifest switches to N+1 only once the
+        snapshot is complete, so a crash at any point replays to the same state.
+        """
+        with self._lock.write():
+            if self._compacting:
+                return
+            self._compacting = True
+            state = {
+                "entries": list(self.vector_db),
+                "live": self.live_count,
+                "segments": self.embeddings.segments,
+                "rows": len(self.embeddings),
+                "dim": self.embeddings.dim,
+                "layout": self.codec.layout(len(self.embeddings), self.embeddings.dim or 0),
+                "version": self.embeddings.version,
+                "bm25": self.bm25.snapshot(len(self.vector_db)),
+                "cache": [
+                    (k, v) for k, v in self.embed_cache.hot_items(EMBED_CACHE_PERSIST_ENTRIES)
+                    if self._validate_embedding(v)
+                ],
+                "previous": self.generation,
+            }
+            with self._journal_lock:
+                self.journal.close()
+                self.generation += 1
+                self.journal = Journal(generation_path(self._path(JOURNAL_FILE), self.generation), JOURNAL_FSYNC)
+            state["generation"] = self.generation
+
+        if background:
+            threading.Thread(target=self._write_snapshot, args=(state,), daemon=True).start()
+        else:
+            self._write_snapshot(state)
+
+    def _write_snapshot(self, state: Dict[str, Any]):
+        generation = state["generation"]
         try:
-            client = openai.OpenAI()
-            
-            prompt = f"""Analyze this content and provide a JSON response with these keys:
+            vectors_path = generation_path(self._path(VECTOR_DB_VECTORS_FILE), generation)
+            if state["dim"] is not None:
+                write_rows(vectors_path, state["segments"], state["rows"], state["dim"], state["layout"])
+            self.save_jsonl(generation_path(self._path(VECTOR_DB_META_FILE), generation), state["entries"])
+
+            cache = state["cache"]
+            cache_vectors_path = generation_path(self._path(EMBED_CACHE_VECTORS_FILE), generation)
+            self.save_jsonl(generation_path(self._path(EMBED_CACHE_KEYS_FILE), generation), [k for k, _ in cache])
+            if cache:
+                write_rows(cache_vectors_path, (v for _, v in cache), len(cache), len(cache[0][1]))
+            bm25_paths = (generation_path(self._path(BM25_POSTINGS_FILE), generation),
+                          generation_path(self._path(BM25_TERMS_FILE), generation))
+            BM25Index.save(state["bm25"], *bm25_paths)
+
+            # Commit point: from here on startup loads this generation
+            self.save_json(self._path(SNAPSHOT_MANIFEST_FILE), {
+                "generation": generation,
+                "entries": state["live"],
+                "cache_entries": len(cache),
+                "cache_keys": "blake2b",
+            })
+
+            saved_bm25 = BM25Index.load_base(*bm25_paths)
+            with self._writing():
+                # Serve the freshly written rows and postings from the memory map instead of RAM
+                if state["dim"] is not None:
+                    self.embeddings.rebase(load_rows(vectors_path), state["version"])
+                if saved_bm25 is not None:
+                    self.bm25.rebase(state["bm25"], saved_bm25)
+                if cache:
+                    for key, row in zip((k for k, _ in cache), load_rows(cache_vectors_path)):
+                        self.embed_cache.rebind(key, row)
+
+            self._remove_generations_before(generation)
+            print(f"[VDB] Compacted store into snapshot generation {generation} ({state['live']} entries).")
+        except Exception as e:
+            print(f"[WARN] Failed writing snapshot generation {generation}: {e}")
+        finally:
+            self._compacting = False
+
+    def _remove_generations_before(self, generation: int):
+        """Delete snapshot and journal files superseded by a committed generation."""
+        for path in (VECTOR_DB_VECTORS_FILE, VECTOR_DB_META_FILE, EMBED_CACHE_VECTORS_FILE,
+                     EMBED_CACHE_KEYS_FILE, BM25_POSTINGS_FILE, BM25_TERMS_FILE, JOURNAL_FILE):
+            directory, name = os.path.split(self._path(path))
+            stem, _, rest = name.partition(".")
+            pattern = re.compile(rf"{re.escape(stem)}(?:-(\d+))?\.{re.escape(rest)}$")
+            for filename in os.listdir(directory or "."):
+                match = pattern.match(filename)
+                if match and int(match.group(1) or 0) < generation:
+                    os.remove(os.path.join(directory, filename))
+
+    def _summary_messages(self, text: str, source: str) -> List[Dict[str, str]]:
+        prompt = f"""Analyze this content and provide a JSON response with these keys:
 - summary: A concise summary (2-3 sentences)
 - topics: Key topics/concepts (comma-separated)
 - content_type: Type of content (e.g., 'API Response', 'Code', 'Documentation')
@@ -182,65 +837,221 @@ class VectorStore:
 Source context: {source}
 
 Content to analyze:
-{text[:1000]}... (truncated)
+{text[:SUMMARY_INPUT_CHARS]}... (truncated)
 
 Respond ONLY with a valid JSON object containing the above keys."""
 
-            response = client.chat.completions.create(
-                model="gpt-4",
-                messages=[{
-                    "role": "system",
-                    "content": "You are a precise content analyzer. You must respond with valid JSON only."
-                },
-                {
-                    "role": "user",
-                    "content": prompt
-                }]
-            )
-            
-            result = json.loads(response.choices[0].message.content)
-            return {
-                "summary": result["summary"],
-                "topics": result["topics"],
-                "content_type": result["content_type"]
-            }
+        return [{
+            "role": "system",
+            "content": "You are a precise content analyzer. You must respond with valid JSON only."
+        },
+        {
+            "role": "user",
+            "content": prompt
+        }]
+
+    def _parse_summary(self, content: Optional[str]) -> Dict[str, str]:
+        result = json.loads(content)
+        return {
+            "summary": result["summary"],
+            "topics": result["topics"],
+            "content_type": result["content_type"]
+        }
+
+    def _failed_summary(self, error: Exception) -> Dict[str, str]:
+        print(f"[ERROR] Summary generation failed: {error}")
+        return {
+            "summary": "Summary generation failed",
+            "topics": "unknown",
+            "content_type": "unknown"
+        }
+
+    def _generate_summary(self, text: str, source: str, model: str = SUMMARY_MODEL) -> Dict[str, str]:
+        """Generate a summary and semantic metadata for the text using GPT (raises on failure)."""
+        client = openai.OpenAI()
+        response = client.chat.completions.create(
+            model=model,
+            messages=self._summary_messages(text, source)
+        )
+        return self._parse_summary(response.choices[0].message.content)
+
+    def get_summary(self, text: Optional[str] = None, source: str = "", doc_hash: Optional[str] = None,
+                    model: str = SUMMARY_MODEL) -> Dict[str, str]:
+        """
+        Summary metadata (summary, topics, content_type) of a document, generated
+        on first need and memoized by content hash; concurrent callers share one
+        request. Pass the text, or the doc_hash of a stored document (its text is
+        rebuilt from the stored chunks). Successful summaries are journaled and
+        copied into the document's chunk metadata; failures are retried next time.
+        """
+        doc_hash = doc_hash or content_hash(text or "")
+        with self._summary_lock:
+            summary = self.summaries.get(doc_hash)
+            if summary is not None:
+                return summary
+            future = self._summary_futures.get(doc_hash)
+            owner = future is None
+            if owner:
+                future = self._summary_futures[doc_hash] = Future()
+        if not owner:
+            return future.result()
+
+        try:
+            if text is None:
+                text = self._document_text(source, doc_hash, SUMMARY_INPUT_CHARS)
+            if not text:
+                raise ValueError(f"No stored text for document {doc_hash} of source={source}")
+            print(f"[VDB] Summarizing document from source='{source}' with model={model}")
+            summary = self._generate_summary(text, source, model)
+            with self._writing():
+                self._apply_summary(source, doc_hash, summary)
+                self._log({"op": "summary", "source": source, "doc_hash": doc_hash, "summary": summary})
         except Exception as e:
-            print(f"[ERROR] Summary generation failed: {e}")
-            return {
-                "summary": "Summary generation failed",
-                "topics": "unknown",
-                "content_type": "unknown"
-            }
+            summary = self._failed_summary(e)
+        finally:
+            with self._summary_lock:
+                del self._summary_futures[doc_hash]
+        future.set_result(summary)
+        return summary
 
-    def add_text(self, text: str, source: str):
-        """Add text to vector store with improved chunking, summarization and metadata."""
-        print(f"[VDB] Storing text from source='{source}', length={len(text)}.")
-        
-        # Check for duplicates first
-        text_hash = hash(text)
-        for entry in self.vector_db:
-            if entry.get("text_hash") == text_hash:
-                print(f"[VDB] Duplicate content detected for source={source}. Skipping.")
+    def _apply_summary(self, source: str, doc_hash: str, summary: Dict[str, str]):
+        """Memoize a summary and copy it into the metadata of the document's chunks (caller holds the write lock)."""
+        self.summaries[doc_hash] = summary
+        for row in self._chunk_rows.get((source, doc_hash), {}).values():
+            entry = self.vector_db[row]
+            entry["meta"].update(summary)
+            self.columns.add(row, entry)
+        self.revision += 1  # content_type filters may match differently now
+
+    def _document_text(self, source: str, doc_hash: str, max_chars: Optional[int] = None) -> str:
+        """A stored document rebuilt from its chunks in order (stopping once max_chars are reached)."""
+        with self._lock.read():
+            chunk_rows = self._chunk_rows.get((source, doc_hash), {})
+            pieces = [self.vector_db[chunk_rows[i]] for i in sorted(chunk_rows)]
+            if not pieces:
+                return ""
+            text = pieces[0]["text"]
+            for previous, entry in zip(pieces, pieces[1:]):
+                if max_chars is not None and len(text) >= max_chars:
+                    break
+                text = self._join_chunks(text, previous, entry)
+        return text
+
+    def _schedule_summary(self, source: str, doc_hash: str, text: str):
+        """
+        With SUMMARY_MODE="background", queue the document for summarization by
+        SUMMARY_BACKGROUND_MODEL on this store's summary thread; otherwise (or when
+        the queue is full) the summary stays lazy.
+        """
+        if SUMMARY_MODE != "background":
+            return
+        with self._summary_lock:
+            if self._summary_queue is None:
+                self._summary_queue = queue.Queue(maxsize=SUMMARY_QUEUE_SIZE)
+                self._summary_thread = threading.Thread(target=self._summary_worker, args=(self._summary_queue,),
+                                                        name="summaries", daemon=True)
+                self._summary_thread.start()
+            summary_queue = self._summary_queue
+        try:
+            summary_queue.put_nowait((source, doc_hash, text[:SUMMARY_INPUT_CHARS]))
+        except queue.Full:
+            print(f"[WARN] Summary queue full; document from source='{source}' will be summarized on demand")
+
+    def _summary_worker(self, summary_queue: queue.Queue):
+        while True:
+            item = summary_queue.get()
+            if item is None:  # Sentinel from _stop_summary_worker
+                summary_queue.task_done()
                 return
-        
-        # Generate semantic summary and metadata
-        semantic_metadata = self._generate_summary(text, source)
-        
-        # Get chunks with position information
-        chunks = self.chunk_text(text)
-        total_chunks = len(chunks)
-        
+            source, doc_hash, text = item
+            try:
+                self.get_summary(text, source, doc_hash, SUMMARY_BACKGROUND_MODEL)
+            except Exception as e:
+                print(f"[ERROR] Background summary for source={source} failed: {e}")
+            finally:
+                summary_queue.task_done()
+
+    def _stop_summary_worker(self):
+        """
+        Drop queued summaries (they stay lazy), let the one in flight finish and
+        join the worker, so nothing journals after the journal is closed.
+        """
+        with self._summary_lock:
+            summary_queue, thread = self._summary_queue, self._summary_thread
+            self._summary_queue = self._summary_thread = None
+        if thread is None:
+            return
+        dropped = 0
+        while True:
+            try:
+                summary_queue.get_nowait()
+            except queue.Empty:
+                break
+            summary_queue.task_done()
+            dropped += 1
+        if dropped:
+            print(f"[VDB] Dropped {dropped} queued summaries on close; they will be generated on demand")
+        summary_queue.put(None)
+        thread.join()
+
+    def _claim_document(self, text: str, source: str) -> Optional[str]:
+        """
+        Content hash of a document, claimed for ingestion until _release_document;
+        None if the store already holds it or another caller is ingesting it.
+        """
+        doc_hash = content_hash(text)
+        with self._write_mutex:
+            duplicate = self.dedup.has_document(doc_hash) or doc_hash in self._ingesting
+            if not duplicate:
+                self._ingesting.add(doc_hash)
+        if duplicate:
+            print(f"[VDB] Duplicate content detected for source={source}. Skipping.")
+            return None
+        return doc_hash
+
+    def _release_document(self, doc_hash: str):
+        with self._write_mutex:
+            self._ingesting.discard(doc_hash)
+
+    def _novel_chunks(self, chunks: Iterable[Tuple[str, int, int]]) -> Tuple[List[Tuple[int, str, int, int, int]], int]:
+        """
+        Drop chunks that are exact or near duplicates of stored chunks (or of earlier
+        chunks of the same document). Consumes the chunk stream and returns
+        ([(chunk_index, text, start, end, simhash)], total chunk count).
+        """
+        novel = []
+        seen_hashes, seen_fingerprints = set(), set()
+        total = 0
         for i, (chunk_text, start_pos, end_pos) in enumerate(chunks):
-            # Get embedding with retries
-            embedding = self.embed_text(chunk_text)
-            if not embedding:
+            total += 1
+            text_hash = content_hash(chunk_text)
+            fingerprint = simhash(chunk_text)
+            with self._lock.read():
+                stored = self.dedup.has_chunk(text_hash) or self.dedup.near_duplicate(fingerprint, seen_fingerprints)
+            if stored or text_hash in seen_hashes:
+                continue
+            seen_hashes.add(text_hash)
+            seen_fingerprints.add(fingerprint)
+            novel.append((i, chunk_text, start_pos, end_pos, fingerprint))
+
+        skipped = total - len(novel)
+        if skipped:
+            print(f"[VDB] Skipping {skipped}/{total} chunks already in the store (exact or near duplicates).")
+        return novel, total
+
+    def _store_chunks(self, source: str, doc_hash: str, total_chunks: int,
+                      chunks: List[Tuple[int, str, int, int, int]],
+                      chunk_embeddings: List[np.ndarray]):
+        """Append embedded chunks to the store and journal them (with the document's summary, if known)."""
+        semantic_metadata = self.summaries.get(doc_hash, {})
+        for (i, chunk_text, start_pos, end_pos, fingerprint), embedding in zip(chunks, chunk_embeddings):
+            if embedding.size == 0:
                 print(f"[VDB] Failed to embed chunk {i+1}/{total_chunks}. Skipping.")
                 continue
                 
             entry_id = f"{source}_chunk_{i}"
             
-            # Enhanced metadata with summary
-            self.vector_db.append({
+            entry = {
                 "id": entry_id,
                 "meta": {
                     "source": source,
@@ -249,22 +1060,90 @@ Respond ONLY with a valid JSON object containing the above keys."""
                     "start_position": start_pos,
                     "end_position": end_pos,
                     "chunk_size": len(chunk_text),
-                    "summary": semantic_metadata["summary"],
-                    "topics": semantic_metadata["topics"],
-                    "content_type": semantic_metadata["content_type"]
+                    "doc_hash": doc_hash,
+                    **semantic_metadata
                 },
                 "text": chunk_text,
-                "text_hash": hash(chunk_text),
-                "embedding": embedding,
+                "text_hash": content_hash(chunk_text),
+                "simhash": fingerprint,
                 "timestamp": time.time()
-            })
+            }
+            with self._writing():
+                # Another document may have stored the same chunk since _novel_chunks looked
+                stored = self.dedup.has_chunk(entry["text_hash"]) or self.dedup.near_duplicate(fingerprint)
+                if not stored:
+                    self._append_entry(entry, embedding)
+                    self._log({"op": "add", "entry": entry, "embedding": encode_vector(embedding)})
+            if stored:
+                print(f"[VDB] Chunk={entry_id} was stored concurrently. Skipping.")
+                continue
             print(f"[VDB] Saved chunk={entry_id}, chunk_length={len(chunk_text)}")
             
+        self._maybe_compact()
+        print(f"[VDB] Done storing. DB now has {self.live_count} entries.")
+
+    def add_text(self, text: str, source: str):
+        """
+        Add text to vector store with improved chunking and metadata. Only the
+        chunks are embedded here; the document summary is left to get_summary
+        (or the background queue, see SUMMARY_MODE).
+        """
+        print(f"[VDB] Storing text from source='{source}', length={len(text)}.")
+        
+        # Check for duplicates first (and keep concurrent callers from ingesting the same document)
+        doc_hash = self._claim_document(text, source)
+        if doc_hash is None:
+            return
+
+        try:
+            # Get chunks with position information, minus content we already have
+            novel_chunks, total_chunks = self._novel_chunks(self.chunk_text(text))
+            if not novel_chunks:
+                return
+
+            # Embed all chunks up front in as few batched requests as possible
+            chunk_embeddings = self.embed_texts([chunk[1] for chunk in novel_chunks])
+            self._store_chunks(source, doc_hash, total_chunks, novel_chunks, chunk_embeddings)
+        finally:
+            self._release_document(doc_hash)
+        self._schedule_summary(source, doc_hash, text)
+
+    async def add_text_async(self, text: str, source: str):
+        """
+        Async add_text for use from Chainlit handlers: chunking and embedding
+        requests run without blocking the event loop. Everything that takes the
+        store's locks (duplicate checks, cache updates, the commit) runs on the
+        offload thread pool, never on the loop.
+        """
+        print(f"[VDB] Storing text (async) from source='{source}', length={len(text)}.")
+        doc_hash = await run_blocking(self._claim_document, text, source)
+        if doc_hash is None:
+            return
+
         try:
-            self.save_store()
-            print(f"[VDB] Done storing. DB now has {len(self.vector_db)} entries.")
+            chunks = await self.chunk_text_async(text)
+            novel_chunks, total_chunks = await run_blocking(self._novel_chunks, chunks)
+            if not novel_chunks:
+                return
+
+            chunk_embeddings = await self.embed_texts_async([chunk[1] for chunk in novel_chunks])
+            await run_blocking(self._store_chunks, source, doc_hash, total_chunks, novel_chunks, chunk_embeddings)
+        finally:
+            await run_blocking(self._release_document, doc_hash)
+        self._schedule_summary(source, doc_hash, text)
+
+    def schedule_add_text(self, text: str, source: str) -> asyncio.Task:
+        """Store text in the background so the caller (e.g. a chat reply) is not delayed."""
+        task = asyncio.get_running_loop().create_task(self._add_text_background(text, source))
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+        return task
+
+    async def _add_text_background(self, text: str, source: str):
+        try:
+            await self.add_text_async(text, source)
         except Exception as e:
-            print(f"[ERROR] Failed to save vector store: {e}")
+            print(f"[ERROR] Background storing for source={source} failed: {e}")
 
     def _calculate_dynamic_threshold(self, query: str) -> float:
         """Calculate dynamic similarity threshold based on query characteristics."""
@@ -280,85 +1159,338 @@ Respond ONLY with a valid JSON object containing the above keys."""
             
         return MIN_SIMILARITY
 
-    def _rerank_results(self, hits: List[Tuple[float, str, str]], query: str) -> List[Tuple[float, str, str]]:
-        """Rerank search results using additional criteria."""
-        if len(hits) <= 1:
-            return hits
-            
-        reranked = []
-        for score, text, id in hits[:MAX_RERANK_CANDIDATES]:
-            # Find the entry
-            entry = next((e for e in self.vector_db if e["id"] == id), None)
-            if not entry:
-                continue
-                
-            # Calculate additional ranking factors with safe fallbacks
-            meta = entry.get("meta", {})
-            chunk_index = meta.get("chunk_index", 0)
-            total_chunks = meta.get("total_chunks", 1)
-            timestamp = entry.get("timestamp", time.time())
-            
-            # Avoid division by zero
-            chunk_position_penalty = 0.1 * (chunk_index / total_chunks) if total_chunks > 0 else 0
-            
-            # Calculate recency boost (within last 24 hours)
-            time_diff = time.time() - timestamp
-            recency_boost = 0.1 * max(0, 1.0 - time_diff / (24 * 3600))
-            
-            # Combine factors
-            adjusted_score = score - chunk_position_penalty + recency_boost
-            reranked.append((adjusted_score, text, id))
-            
-        return sorted(reranked, key=lambda x: x[0], reverse=True)
+    def _rerank_results(self, rows: np.ndarray, scores: np.ndarray, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Rerank candidate rows (best vector score first) using additional criteria:
+        a penalty for chunks late in their document, a boost for recent entries and,
+        with MMR_LAMBDA < 1, maximal marginal relevance to avoid near-identical chunks.
+        Returns up to top_k row numbers, best first, with their adjusted scores.
+        """
+        if len(rows) <= 1:
+            return rows[:top_k], scores[:top_k]
 
-    def search(self, query: str, top_k: int = 3, min_similarity: float = None) -> List[str]:
+        now = time.time()
+        entries = [self.vector_db[row] for row in rows]
+        chunk_index = np.fromiter((e["meta"].get("chunk_index", 0) for e in entries), dtype=np.float32, count=len(rows))
+        total_chunks = np.fromiter((e["meta"].get("total_chunks", 1) for e in entries), dtype=np.float32, count=len(rows))
+        timestamps = np.fromiter((e.get("timestamp", now) for e in entries), dtype=np.float64, count=len(rows))
+
+        # Avoid division by zero
+        position_penalty = 0.1 * np.divide(chunk_index, total_chunks, out=np.zeros_like(chunk_index), where=total_chunks > 0)
+        # Recency boost (within last 24 hours)
+        recency_boost = 0.1 * np.clip(1.0 - (now - timestamps) / (24 * 3600), 0.0, None)
+        adjusted = scores - position_penalty + recency_boost
+
+        if MMR_LAMBDA >= 1.0 or len(rows) <= top_k:
+            order = np.argsort(-adjusted, kind="stable")[:top_k]
+            return rows[order], adjusted[order]
+
+        # take() wants ascending rows; scatter the vectors back into candidate order
+        order = np.argsort(rows)
+        vectors = np.empty((len(rows), self.embeddings.dim), dtype=np.float32)
+        vectors[order] = self.embeddings.take(rows[order])
+        similarity = vectors @ vectors.T
+
+        selected = []
+        redundancy = np.zeros(len(rows), dtype=np.float32)
+        available = np.ones(len(rows), dtype=bool)
+        for _ in range(min(top_k, len(rows))):
+            mmr = np.where(available, MMR_LAMBDA * adjusted - (1.0 - MMR_LAMBDA) * redundancy, -np.inf)
+            pick = int(np.argmax(mmr))
+            selected.append(pick)
+            available[pick] = False
+            np.maximum(redundancy, similarity[pick], out=redundancy)
+        return rows[selected], adjusted[selected]
+
+    def search(self, query: str, top_k: int = 3, min_similarity: float = None,
+               rerank: Optional[bool] = None, mode: Optional[str] = None,
+               filters: Optional[Dict[str, Any]] = None, neighbors: Optional[int] = None) -> List[str]:
         """
         Search for similar texts in the vector store.
         
         Args:
             query: The search query
             top_k: Number of results to return
-            min_similarity: Minimum similarity threshold (0-1)
+            min_similarity: Minimum similarity threshold (0-1); with reranking it
+                defaults to the dynamic threshold for the query
+            rerank: Two-stage retrieval (vector candidates, then rerank over
+                MAX_RERANK_CANDIDATES); defaults to RERANK_ENABLED
+            mode: "dense" (embeddings), "lexical" (BM25 only, no embedding call)
+                or "hybrid" (both, fused by reciprocal rank); defaults to SEARCH_MODE
+            filters: Restrict to rows matching metadata before scoring, e.g.
+                {"source": ..., "exclude_source": [...], "content_type": ...,
+                "since": ts, "until": ts}; content_type only matches summarized
+                documents (see MetadataColumns.mask)
+            neighbors: Return passages instead of chunks: each hit with this many
+                neighboring chunks of its document on either side, hits from
+                the same stretch of a document merged, chunk overlaps removed
             
         Returns:
             List of matching texts
         """
+        return [result.text for result in self.search_with_scores(query, top_k, min_similarity, rerank, mode, filters,
+                                                                  neighbors=neighbors)]
+
+    async def search_async(self, query: str, top_k: int = 3, **kwargs) -> List[str]:
+        """Awaitable search: query embedding and scoring run on the offload thread pool."""
+        return await run_blocking(self.search, query, top_k, **kwargs)
+
+    def search_with_scores(self, query: str, top_k: int = 3, min_similarity: float = None,
+                           rerank: Optional[bool] = None, mode: Optional[str] = None,
+                           filters: Optional[Dict[str, Any]] = None,
+                           query_embedding: Optional[np.ndarray] = None,
+                           neighbors: Optional[int] = None) -> List[SearchResult]:
+        """
+        search() returning SearchResult records (id, score, source, chunk span,
+        text), best first; scores are the final ranking scores (relevance in
+        [0, 1], adjusted by reranking). A precomputed query_embedding skips the
+        embedding lookup, e.g. when one query is run against several stores.
+        With neighbors, results are passages scored by their best hit.
+        Returned chunks are marked as retrieved now (see apply_retention).
+        """
+        results = self._ranked_results(query, top_k, min_similarity, rerank, mode, filters, query_embedding, neighbors)
+        self._touch(results)
+        return results
+
+    def _ranked_results(self, query: str, top_k: int, min_similarity: Optional[float], rerank: Optional[bool],
+                        mode: Optional[str], filters: Optional[Dict[str, Any]],
+                        query_embedding: Optional[np.ndarray], neighbors: Optional[int]) -> List[SearchResult]:
         if not query:
             return []
-            
-        query_embedding = self.embed_text(query)
-        if not query_embedding:
+
+        rerank = RERANK_ENABLED if rerank is None else rerank
+        mode = mode or SEARCH_MODE
+        if mode not in ("dense", "lexical", "hybrid"):
+            raise ValueError(f"Unknown search mode {mode!r}")
+        params = (top_k, min_similarity, rerank, mode, filter_key(filters), neighbors)
+        revision = self.revision
+        cached = self.query_cache.get(query, params, revision)
+        if cached is not None:
+            return cached
+
+        if mode == "lexical":
+            with self._lock.read():
+                results = self._hit_results(self._search_rows(query, None, top_k, min_similarity, rerank, mode, filters),
+                                            neighbors)
+            self.query_cache.put(query, params, revision, None, results)
+            return results
+
+        if query_embedding is None:
+            query_embedding = self.embed_text(query)
+        if query_embedding.size == 0:
             return []
-            
-        results = []
-        similarities = []
-        
-        # Calculate similarities with all entries
-        for entry in self.vector_db:
-            if "embedding" not in entry:
-                continue
-                
-            similarity = self.cos_sim(query_embedding, entry["embedding"])
-            if min_similarity and similarity < min_similarity:
-                continue
-                
-            similarities.append((similarity, entry))
-            
-        # Sort by similarity and take top_k
-        similarities.sort(key=lambda x: x[0], reverse=True)
-        top_results = similarities[:top_k]
-        
-        # Extract texts
-        for similarity, entry in top_results:
-            if "text" in entry:
-                results.append(entry["text"])
-                
+        cached = self.query_cache.get_similar(query_embedding, params, revision)
+        if cached is not None:
+            return cached
+        with self._lock.read():
+            if not len(self.embeddings):
+                return []
+            results = self._hit_results(
+                self._search_rows(query, query_embedding, top_k, min_similarity, rerank, mode, filters), neighbors
+            )
+        self.query_cache.put(query, params, revision, query_embedding, results)
         return results
 
+    def _touch(self, results: List[SearchResult]):
+        """
+        Record the retrieval time on the chunks behind results (cached ones too).
+        Kept on the entries, so it reaches disk with the next snapshot without
+        journaling every search.
+        """
+        if not results:
+            return
+        now = time.time()
+        with self._lock.read():
+            for result in results:
+                if result.doc_hash is None:
+                    rows = self._id_rows.get(result.id, [])
+                else:
+                    chunk_rows = self._chunk_rows.get((result.source, result.doc_hash), {})
+                    first, last = result.chunks
+                    rows = [chunk_rows[i] for i in range(first, last + 1) if i in chunk_rows]
+                for row in rows:
+                    entry = self.vector_db[row]
+                    if entry is not None:
+                        entry["last_hit"] = now
+
+    def _search_rows(self, query: str, query_embedding: Optional[np.ndarray], top_k: int,
+                     min_similarity: Optional[float], rerank: bool, mode: str,
+                     filters: Optional[Dict[str, Any]] = None) -> List[Tuple[int, float]]:
+        """
+        Rank rows for a query: dense candidates above the similarity threshold,
+        BM25 hits, or both fused; then rerank (or cut) the pool to top_k.
+        Pool scores are relevance in [0, 1] (cosine, or BM25/RRF scaled by their maximum).
+        Returns (row, score) pairs, best first; the caller holds the read lock.
+        """
+        pool_size = max(top_k, MAX_RERANK_CANDIDATES) if rerank else top_k
+        allowed = None
+        if filters:
+            allowed = self.embeddings.alive & self.columns.mask(filters, len(self.vector_db))
+        if mode == "lexical":
+            rows, scores = self.bm25.search(query, pool_size, allowed)
+            if len(scores):
+                scores = scores / self.bm25.max_score(query)
+        else:
+            rows, scores = self._score_rows(query_embedding, allowed)
+            if min_similarity is None and rerank:
+                min_similarity = self._calculate_dynamic_threshold(query)
+            candidates = np.flatnonzero(scores >= min_similarity) if min_similarity else None
+            pool = EmbeddingMatrix.top_k(scores, pool_size, candidates)
+            rows, scores = rows[pool], scores[pool]
+            if mode == "hybrid":
+                lexical_rows, _ = self.bm25.search(query, pool_size, allowed)
+                rows, scores = self._fuse_rankings(rows, lexical_rows)
+                rows, scores = rows[:pool_size], scores[:pool_size]
+
+        if rerank:
+            rows, scores = self._rerank_results(rows, scores, top_k)
+        return [
+            (int(row), float(score))
+            for row, score in zip(rows[:top_k], scores[:top_k]) if "text" in self.vector_db[row]
+        ]
+
+    def _hit_results(self, hits: List[Tuple[int, float]], neighbors: Optional[int]) -> List[SearchResult]:
+        """Records for ranked rows: the chunks, or passages with neighbors (caller holds the read lock)."""
+        if neighbors is None:
+            return [self._result(self.vector_db[row], score) for row, score in hits]
+        return self._expand_passages(hits, max(neighbors, 0))
+
+    @staticmethod
+    def _result(entry: Dict[str, Any], score: float, pieces: Optional[List[Dict[str, Any]]] = None,
+                text: Optional[str] = None) -> SearchResult:
+        """SearchResult for a hit entry, spanning pieces (its passage's chunks, in order) if given."""
+        meta = entry["meta"]
+        first, last = (pieces[0]["meta"], pieces[-1]["meta"]) if pieces else (meta, meta)
+        return SearchResult(
+            id=entry["id"],
+            score=score,
+            source=meta["source"],
+            doc_hash=meta.get("doc_hash"),
+            chunks=(first.get("chunk_index", 0), last.get("chunk_index", 0)),
+            span=(first.get("start_position", 0), last.get("end_position", 0)),
+            text=entry["text"] if text is None else text,
+            timestamp=entry.get("timestamp"),
+        )
+
+    def _expand_passages(self, hits: List[Tuple[int, float]], neighbors: int) -> List[SearchResult]:
+        """
+        Widen each hit to the chunks within `neighbors` positions in its document,
+        merge ranges of one document that overlap or touch, and join each range's
+        chunks into one text without repeating their CHUNK_OVERLAP tokens.
+        Passages score as their best hit and keep the order of their first hit.
+        """
+        spans = defaultdict(list)  # document -> [(first, last, score, rank of the hit)]
+        single_rows = {}
+        for rank, (row, score) in enumerate(hits):
+            entry = self.vector_db[row]
+            document, index, reach = self._document_key(entry), entry["meta"].get("chunk_index", 0), neighbors
+            if document[1] is None:
+                # Stored without a doc_hash: its neighbors can't be told apart from other documents of the source
+                document, index, reach = (document[0], f"row-{row}"), 0, 0
+                single_rows[document] = {0: row}
+            spans[document].append((max(index - reach, 0), index + reach, score, rank))
+
+        ranges = []  # (rank of the best hit, document, first, last, score)
+        for document, document_spans in spans.items():
+            document_spans.sort()
+            merged = [list(document_spans[0])]
+            for first, last, score, rank in document_spans[1:]:
+                current = merged[-1]
+                if first <= current[1] + 1:
+                    current[1], current[2], current[3] = max(current[1], last), max(current[2], score), min(current[3], rank)
+                else:
+                    merged.append([first, last, score, rank])
+            ranges.extend((rank, document, first, last, score) for first, last, score, rank in merged)
+        ranges.sort(key=lambda r: r[0])
+
+        passages = []
+        for rank, document, first, last, score in ranges:
+            chunk_rows = single_rows.get(document) or self._chunk_rows.get(document, {})
+            pieces = [self.vector_db[chunk_rows[i]] for i in range(first, last + 1) if i in chunk_rows]
+            text = pieces[0]["text"]
+            for previous, entry in zip(pieces, pieces[1:]):
+                text = self._join_chunks(text, previous, entry)
+            passages.append(self._result(self.vector_db[hits[rank][0]], score, pieces, text))
+        return passages
+
+    @staticmethod
+    def _join_chunks(text: str, previous: Dict[str, Any], entry: Dict[str, Any]) -> str:
+        """Append entry's chunk to a passage ending with previous's chunk, dropping their shared tokens."""
+        meta, previous_meta = entry["meta"], previous["meta"]
+        overlap_tokens = previous_meta.get("end_position", 0) - meta.get("start_position", 0)
+        adjacent = meta.get("chunk_index", 0) == previous_meta.get("chunk_index", 0) + 1
+        if not adjacent or overlap_tokens < 0:
+            return f"{text}\n\n{entry['text']}"  # A chunk in between is missing (duplicate or deleted)
+        if overlap_tokens == 0:
+            return text + entry["text"]
+        chunk_tokens = max(meta.get("end_position", 0) - meta.get("start_position", 0), 1)
+        expected = overlap_tokens * len(entry["text"]) // chunk_tokens
+        return join_overlapping(text, entry["text"], expected)
+
+    @staticmethod
+    def _fuse_rankings(*rankings: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Reciprocal rank fusion: each row scores sum(1 / (RRF_K + rank)) over the
+        rankings it appears in. Returns rows best first with scores scaled so that
+        ranking first everywhere is 1 (absolute, so comparable across stores).
+        """
+        rows = np.concatenate(rankings).astype(np.int64)
+        if not len(rows):
+            return rows, np.empty(0, dtype=np.float32)
+        contributions = np.concatenate([1.0 / (RRF_K + np.arange(1, len(r) + 1)) for r in rankings])
+        unique, inverse = np.unique(rows, return_inverse=True)
+        fused = np.bincount(inverse, weights=contributions)
+        order = np.argsort(-fused, kind="stable")
+        return unique[order], (fused[order] * (RRF_K + 1) / len(rankings)).astype(np.float32)
+
+    def _score_rows(self, query_embedding: np.ndarray,
+                    allowed: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Score the query against the eligible rows (live rows, or the `allowed`
+        mask). Many eligible rows: only the rows the ANN index proposes are
+        scored; few: they are scanned exhaustively. Those rows can first be
+        narrowed to a shortlist by truncated-prefix scores and/or PQ codes; only
+        the shortlist is scored at full precision.
+        Returns (row numbers, scores) aligned with each other.
+        """
+        total = len(self.embeddings)
+        alive = self.embeddings.alive if allowed is None else allowed
+        eligible = int(alive.sum())
+        use_ann = self.ann is not None and eligible >= ANN_MIN_ROWS
+        use_coarse = self.coarse is not None and eligible > COARSE_RESCORE_CANDIDATES
+        use_pq = self.pq is not None and eligible >= PQ_MIN_ROWS
+        if not (use_ann or use_coarse or use_pq):
+            rows = np.flatnonzero(alive)
+            if eligible > total // 2:
+                return rows, self.embeddings.scores(query_embedding)[rows]
+            # Filtered down to a few rows: gather and score only those
+            return rows, self.embeddings.scores_for(query_embedding, rows)
+
+        query = EmbeddingMatrix.normalize(query_embedding)
+        if use_ann:
+            with self._index_lock:
+                if self.ann.needs_rebuild(total):
+                    self.ann.build(self.embeddings)
+            rows = self.ann.candidates(query)
+            rows = rows[alive[rows]]
+        else:
+            rows = np.flatnonzero(alive)
+        if use_coarse:
+            with self._index_lock:
+                if self.coarse.needs_rebuild(total):
+                    self.coarse.build(self.embeddings)
+            rows = self.coarse.shortlist(query, rows)
+        if use_pq:
+            with self._index_lock:
+                if self.pq.needs_rebuild(total):
+                    self.pq.build(self.embeddings)
+            rows = self.pq.shortlist(query, rows)
+        return rows, self.embeddings.scores_for(query_embedding, rows)
+
     def list_memories(self) -> List[Dict[str, Any]]:
         """List all memories with metadata."""
         memories = []
-        for entry in self.vector_db:
+        for entry in self._live_entries():
             memory = {
                 "id": entry["id"],
                 "source": entry["meta"]["source"],
@@ -370,82 +1502,120 @@ Respond ONLY with a valid JSON object containing the above keys."""
 
     def get_memory_stats(self) -> Dict[str, Any]:
         """Get statistics about the memory store."""
-        if not self.vector_db:
+        if not self.live_count:
             return {
                 "total_memories": 0,
                 "total_sources": 0,
                 "source_counts": {},
                 "oldest_memory": None,
-                "newest_memory": None
+                "newest_memory": None,
+                "embedding_cache": self.embed_cache.stats(),
+                "embedder": self.embedder.stats(),
+                "query_cache": self.query_cache.stats(),
+                "vector_storage": self._storage_stats()
             }
 
         source_counts = defaultdict(int)
         timestamps = []
         
-        for entry in self.vector_db:
+        for entry in self._live_entries():
             source = entry["meta"]["source"]
             source_counts[source] += 1
             if "timestamp" in entry:
                 timestamps.append(entry["timestamp"])
 
         stats = {
-            "total_memories": len(self.vector_db),
+            "total_memories": self.live_count,
             "total_sources": len(source_counts),
             "source_counts": dict(source_counts),
             "oldest_memory": min(timestamps) if timestamps else None,
-            "newest_memory": max(timestamps) if timestamps else None
+            "newest_memory": max(timestamps) if timestamps else None,
+            "embedding_cache": self.embed_cache.stats(),
+            "embedder": self.embedder.stats(),
+            "query_cache": self.query_cache.stats(),
+            "vector_storage": self._storage_stats()
         }
         return stats
 
+    def _storage_stats(self) -> Dict[str, Any]:
+        return {
+            "dtype": self.codec.name,
+            "dimensions": self.embeddings.dim,
+            "rows": len(self.embeddings),
+            "bytes": self.embeddings.nbytes,
+            "pq_index_rows": len(self.pq) if self.pq is not None else 0,
+        }
+
+    def apply_retention(self, now: Optional[float] = None) -> int:
+        """
+        Evict chunks past their RETENTION_POLICIES age or chunk cap, then the
+        least recently retrieved chunks while this store exceeds
+        RETENTION_MAX_BYTES_PER_STORE (other shards are not counted). Returns
+        how many chunks were evicted.
+        """
+        if not RETENTION_POLICIES and not RETENTION_MAX_BYTES_PER_STORE:
+            return 0
+        now = time.time() if now is None else now
+        with self._lock.read():
+            live = [(row, entry) for row, entry in enumerate(self.vector_db) if entry is not None]
+            row_bytes = self.embeddings.nbytes / len(self.embeddings) if len(self.embeddings) else 0.0
+        evicted = select_evictions(live, row_bytes, now, RETENTION_POLICIES, RETENTION_MAX_BYTES_PER_STORE)
+        if not evicted:
+            return 0
+
+        selected = dict(live)
+        with self._write_mutex:
+            # A purge since the selection shifts rows; only evict rows still holding the selected entry
+            rows = [row for row in evicted if row < len(self.vector_db) and self.vector_db[row] is selected[row]]
+            deleted = self._delete_rows(rows)
+        if deleted:
+            self._maybe_compact()
+            reasons = dict(Counter(evicted[row] for row in rows))
+            print(f"[VDB] Retention evicted {deleted} chunks {reasons}; {self.live_count} remain.")
+        return deleted
+
     def delete_memory(self, memory_id: str) -> bool:
         """Delete a specific memory by ID."""
-        initial_length = len(self.vector_db)
-        self.vector_db = [entry for entry in self.vector_db if entry["id"] != memory_id]
-        
-        if len(self.vector_db) < initial_length:
-            self.save_store()
+        with self._write_mutex:
+            deleted = self._delete_rows(self._id_rows.get(memory_id, []))
+        if deleted:
+            self._maybe_compact()
             print(f"[VDB] Deleted memory with ID: {memory_id}")
             return True
         return False
 
     def delete_source(self, source: str) -> int:
         """Delete all memories from a specific source."""
-        initial_length = len(self.vector_db)
-        self.vector_db = [entry for entry in self.vector_db if entry["meta"]["source"] != source]
-        
-        deleted_count = initial_length - len(self.vector_db)
+        with self._write_mutex:
+            deleted_count = self._delete_rows(self._source_rows.get(source, []))
         if deleted_count > 0:
-            self.save_store()
+            self._maybe_compact()
             print(f"[VDB] Deleted {deleted_count} memories from source: {source}")
         return deleted_count
 
     def clean_duplicates(self) -> int:
         """Remove duplicate memories based on text_hash."""
         seen_hashes = set()
-        unique_entries = []
-        duplicates = 0
 
-        for entry in self.vector_db:
+        def is_first(entry):
             text_hash = entry.get("text_hash")
-            if text_hash not in seen_hashes:
-                seen_hashes.add(text_hash)
-                unique_entries.append(entry)
-            else:
-                duplicates += 1
+            if text_hash in seen_hashes:
+                return False
+            seen_hashes.add(text_hash)
+            return True
 
+        duplicates = self._filter_entries(is_first)
         if duplicates > 0:
-            self.vector_db = unique_entries
-            self.save_store()
+            self._maybe_compact()
             print(f"[VDB] Removed {duplicates} duplicate memories")
         return duplicates
 
     def clear_all_memories(self) -> int:
         """Clear all memories from the store."""
-        count = len(self.vector_db)
-        self.vector_db = []
-        self.save_store()
+        with self._writing():
+            count = self.live_count
+            self._clear_entries()
+            self._log({"op": "clear"})
+        self._maybe_compact()
         print(f"[VDB] Cleared all {count} memories")
         return count
-
-# Initialize global vector store instance
-vector_store = VectorStore() 
\ No newline at end of file
@@ -3,7 +3,9 @@ import json
 import time
 from typing import Dict, List, Any, Optional
 
-from src.database.vector_store import vector_store
+from src.config.settings import PASSAGE_NEIGHBORS, MEMORY_SEARCH_TOKENS
+from src.database.search_results import assemble_context
+from src.database.store_manager import store_manager
 from src.utils.query_logger import query_logger
 
 def fetch_youtube_transcript(video_url: str) -> Dict[str, Any]:
@@ -20,11 +22,10 @@ def fetch_youtube_transcript(video_url: str) -> Dict[str, Any]:
         # Process transcript into text
         full_text = " ".join([entry["text"] for entry in transcript])
         
-        # Generate summary using the vector store's summarization
-        summary_metadata = vector_store._generate_summary(full_text, f"youtube_transcript_{video_id}")
-        
-        # Store in vector DB with source and metadata
-        vector_store.add_text(full_text, f"youtube_transcript_{video_id}")
+        # Store in vector DB, then summarize once (memoized per content hash; no second request later)
+        with store_manager.current() as store:
+            store.add_text(full_text, f"youtube_transcript_{video_id}")
+            summary_metadata = store.get_summary(full_text, f"youtube_transcript_{video_id}")
         
         # Also save to file for reference
         file_path = os.path.join("knowledge_repo", f"{video_id}_transcript.txt")
@@ -63,7 +64,7 @@ async def write_file(path: str, file_content: str, file_type: str = "text") -> D
             
         # Store in vector DB if it's a text file
         if file_type.lower() in ["text", "markdown", "code"]:
-            vector_store.add_text(file_content, f"file_{path}")
+            await store_manager.add_text_async(file_content, f"file_{path}")
             
         return {
             "success": True,
@@ -92,8 +93,9 @@ def read_file(path: str, fmt: str = "string") -> Dict[str, Any]:
     except Exception as e:
         return {"error": f"Failed to read file: {str(e)}"}
 
-def memory_search(query: str, top_k: int = 3) -> Dict[str, Any]:
-    """Search vector store with metadata."""
+def memory_search(query: str, top_k: int = 3, source: Optional[str] = None,
+                  neighbors: Optional[int] = None) -> Dict[str, Any]:
+    """Search vector store with metadata; results are passages of neighboring chunks around each hit."""
     try:
         # If the query looks like a YouTube URL, try to fetch it first
         if "youtube.com/watch?v=" in query or "youtu.be/" in query:
@@ -109,11 +111,19 @@ def memory_search(query: str, top_k: int = 3) -> Dict[str, Any]:
                 }
         
         # Regular memory search
-        results = vector_store.search(query=query, top_k=top_k)
+        hits = store_manager.search_with_scores(
+            query=query,
+            top_k=top_k,
+            filters={"source": source} if source else None,
+            neighbors=PASSAGE_NEIGHBORS if neighbors is None else neighbors,
+        )
+        # Best results first, cut to the token budget so one search can't flood the context window
+        _, results = assemble_context(hits, MEMORY_SEARCH_TOKENS, with_provenance=False)
         return {
             "success": True,
-            "results": results,
-            "total_results": len(results)
+            "results": [result.to_dict() for result in results],
+            "total_results": len(results),
+            "omitted_results": len(hits) - len(results)
         }
     except Exception as e:
         return {"error": f"Search failed: {str(e)}"}
@@ -121,7 +131,8 @@ def memory_search(query: str, top_k: int = 3) -> Dict[str, Any]:
 def list_memories() -> Dict[str, Any]:
     """List all memories with metadata."""
     try:
-        memories = vector_store.list_memories()
+        with store_manager.current() as store:
+            memories = store.list_memories()
         return {
             "success": True,
             "memories": memories,
@@ -133,7 +144,8 @@ def list_memories() -> Dict[str, Any]:
 def get_memory_stats() -> Dict[str, Any]:
     """Get statistics about the memory store."""
     try:
-        stats = vector_store.get_memory_stats()
+        with store_manager.current() as store:
+            stats = store.get_memory_stats()
         return {
             "success": True,
             "stats": stats
@@ -144,7 +156,8 @@ def get_memory_stats() -> Dict[str, Any]:
 def delete_memory(memory_id: str) -> Dict[str, bool]:
     """Delete a specific memory."""
     try:
-        success = vector_store.delete_memory(memory_id)
+        with store_manager.current() as store:
+            success = store.delete_memory(memory_id)
         return {"success": success}
     except Exception as e:
         return {"error": f"Failed to delete memory: {str(e)}"}
@@ -152,7 +165,8 @@ def delete_memory(memory_id: str) -> Dict[str, bool]:
 def delete_source(source: str) -> Dict[str, Any]:
     """Delete all memories from a source."""
     try:
-        count = vector_store.delete_source(source)
+        with store_manager.current() as store:
+            count = store.delete_source(source)
         return {
             "success": True,
             "deleted_count": count
@@ -163,7 +177,8 @@ def delete_source(source: str) -> Dict[str, Any]:
 def clean_duplicates() -> Dict[str, Any]:
     """Remove duplicate memories."""
     try:
-        count = vector_store.clean_duplicates()
+        with store_manager.current() as store:
+            count = store.clean_duplicates()
         return {
             "success": True,
             "removed_count": count
@@ -174,7 +189,8 @@ def clean_duplicates() -> Dict[str, Any]:
 def clear_all_memories() -> Dict[str, Any]:
     """Clear all memories."""
     try:
-        count = vector_store.clear_all_memories()
+        with store_manager.current() as store:
+            count = store.clear_all_memories()
         return {
             "success": True,
             "cleared_count": count
@@ -295,6 +311,15 @@ local_tools = [
                         "type": "integer",
                         "description": "Number of results to return",
                         "default": 3
+                    },
+                    "source": {
+                        "type": "string",
+                        "description": "Only search memories from this source (e.g. youtube_transcript_<video_id>)"
+                    },
+                    "neighbors": {
+                        "type": "integer",
+                        "description": "Surrounding chunks to include on each side of every hit (more context per result, instead of reading the whole file)",
+                        "default": PASSAGE_NEIGHBORS
                     }
                 },
                 "required": ["query"]
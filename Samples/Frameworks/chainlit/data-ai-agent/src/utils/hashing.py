@@ -0,0 +1,34 @@
+import re
+import hashlib
+import numpy as np
+
+_WORD_RE = re.compile(r"\w+")
+_BIT_POSITIONS = np.arange(64, dtype=np.uint64)
+
+
+def content_hash(text: str) -> str:
+    """Stable 128-bit digest of text (unlike hash(), identical across processes and restarts)."""
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def simhash(text: str, shingle_size: int = 3) -> int:
+    """
+    64-bit SimHash over word shingles. Texts that differ only slightly (a few
+    edited words, a shifted chunk boundary) get fingerprints a few bits apart.
+    """
+    words = _WORD_RE.findall(text.lower())
+    if not words:
+        return 0
+    shingles = {" ".join(words[i:i + shingle_size]) for i in range(max(1, len(words) - shingle_size + 1))}
+    hashes = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "little") for s in shingles),
+        dtype=np.uint64,
+        count=len(shingles),
+    )
+    bits = (hashes[:, np.newaxis] >> _BIT_POSITIONS) & np.uint64(1)
+    votes = 2 * bits.sum(axis=0, dtype=np.int64) - len(hashes)
+    return int(np.sum(np.uint64(1) << _BIT_POSITIONS[votes > 0], dtype=np.uint64))
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
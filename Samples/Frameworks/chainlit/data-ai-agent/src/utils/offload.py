@@ -0,0 +1,61 @@
+import asyncio
+import contextvars
+import functools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional
+
+from src.config.settings import OFFLOAD_MODE, OFFLOAD_WORKERS
+
+_thread_pool: Optional[ThreadPoolExecutor] = None
+_process_pool: Optional[ProcessPoolExecutor] = None
+_process_pool_failed = False  # Stay on threads once worker processes could not run
+
+
+def _get_thread_pool() -> ThreadPoolExecutor:
+    global _thread_pool
+    if _thread_pool is None:
+        _thread_pool = ThreadPoolExecutor(max_workers=OFFLOAD_WORKERS, thread_name_prefix="offload")
+    return _thread_pool
+
+
+def _get_process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    if _process_pool is None:
+        # spawn: forking a process that already runs threads (journal, compaction, pools) is unsafe
+        _process_pool = ProcessPoolExecutor(max_workers=OFFLOAD_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _process_pool
+
+
+async def run_blocking(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    Run a blocking call that needs this process's state (store lookups, scoring,
+    sync API requests) on the offload thread pool. NumPy and network I/O release
+    the GIL, so the event loop keeps streaming meanwhile. Context variables such
+    as the current tenant are carried over. OFFLOAD_MODE="inline" runs it here.
+    """
+    if OFFLOAD_MODE == "inline":
+        return fn(*args, **kwargs)
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(
+        _get_thread_pool(), functools.partial(context.run, fn, *args, **kwargs)
+    )
+
+
+async def run_cpu(fn: Callable[..., Any], *args) -> Any:
+    """
+    Run a pure, CPU-bound function (module-level, picklable arguments and result,
+    e.g. tokenization) in a worker process with OFFLOAD_MODE="process"; otherwise
+    like run_blocking.
+    """
+    global _process_pool, _process_pool_failed
+    if OFFLOAD_MODE != "process" or _process_pool_failed:
+        return await run_blocking(fn, *args)
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_get_process_pool(), functools.partial(fn, *args))
+    except BrokenProcessPool as e:
+        print(f"[WARN] Offload process pool failed ({e}); running CPU work on threads from now on")
+        _process_pool_failed = True
+        _process_pool = None
+        return await run_blocking(fn, *args)
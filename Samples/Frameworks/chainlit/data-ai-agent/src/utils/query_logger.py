@@ -1,10 +1,11 @@
 import os
 import json
 import time
-import tiktoken
 from datetime import datetime
 from typing import Dict, Any, Optional
 
+from src.utils.tokenizer import get_encoding
+
 # Get the project root directory
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 LOGS_DIR = os.path.join(PROJECT_ROOT, "logs")
@@ -17,7 +18,7 @@ class QueryLogger:
     def __init__(self, log_file: str = "agent_queries.jsonl"):
         """Initialize query logger with a log file in the logs directory."""
         self.log_file = os.path.join(LOGS_DIR, log_file)
-        self.tokenizer = tiktoken.encoding_for_model("gpt-4")
+        self.tokenizer = get_encoding("gpt-4")
         self._ensure_log_file()
     
     def _ensure_log_file(self):
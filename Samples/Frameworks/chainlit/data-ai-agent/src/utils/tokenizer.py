@@ -0,0 +1,163 @@
+import re
+import bisect
+import functools
+import tiktoken
+from typing import Iterator, List, Optional, Tuple
+
+SEGMENT_CHARS = 1 << 16  # Characters encoded at a time when streaming large texts
+
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+_SENTENCE_BREAK = re.compile(r"[.!?][\"')\]]*\s|\n")
+
+
+@functools.lru_cache(maxsize=None)
+def get_encoding(model: str = "gpt-4") -> tiktoken.Encoding:
+    """Tokenizer for a model, loaded once per process."""
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def _segments(text: str, segment_chars: int) -> Iterator[Tuple[int, int]]:
+    """
+    Split text into (start, end) spans of about segment_chars. Spans end before a
+    space (BPE tokens carry their leading space) or after a newline, so tokens
+    rarely straddle two spans.
+    """
+    start = 0
+    while start < len(text):
+        end = min(start + segment_chars, len(text))
+        if end < len(text):
+            cut = text.rfind(" ", start + 1, end)
+            if cut < 0:
+                cut = text.rfind("\n", start, end - 1) + 1
+            if cut > start:
+                end = cut
+        yield start, end
+        start = end
+
+
+def _encode_segment(enc: tiktoken.Encoding, text: str, start: int, end: int) -> Tuple[List[int], List[int]]:
+    """Tokens of text[start:end] and the absolute character offset each token starts at."""
+    tokens = enc.encode(text[start:end], disallowed_special=())
+    _, offsets = enc.decode_with_offsets(tokens)
+    return tokens, [start + offset for offset in offsets]
+
+
+def count_tokens(text: str, model: str = "gpt-4", limit: Optional[int] = None) -> int:
+    """
+    Count tokens segment by segment. With a limit, counting stops as soon as it
+    is exceeded, so checking a multi-megabyte string against a threshold is cheap.
+    """
+    enc = get_encoding(model)
+    total = 0
+    for start, end in _segments(text, SEGMENT_CHARS):
+        total += len(enc.encode(text[start:end], disallowed_special=()))
+        if limit is not None and total > limit:
+            break
+    return total
+
+
+def truncate_tokens(text: str, max_tokens: int, model: str = "gpt-4") -> str:
+    """The longest prefix of text within max_tokens tokens, cut at a token boundary."""
+    if max_tokens <= 0:
+        return ""
+    enc = get_encoding(model)
+    end = 0
+    for start, stop in _segments(text, SEGMENT_CHARS):
+        tokens, offsets = _encode_segment(enc, text, start, stop)
+        if len(tokens) > max_tokens:
+            return text[:offsets[max_tokens]]
+        max_tokens -= len(tokens)
+        end = stop
+    return text[:end]
+
+
+def _snap(text: str, start: int, end: int, pattern: "re.Pattern") -> int:
+    """Character index just after the last break matching pattern in text[start:end], or -1."""
+    last = -1
+    for match in pattern.finditer(text, start, end):
+        last = match.end()
+    return last
+
+
+def join_overlapping(left: str, right: str, expected_overlap: Optional[int] = None, probe_chars: int = 32) -> str:
+    """
+    Join two consecutive iter_chunks windows, writing their shared overlap once.
+    The overlap is a suffix of left that is a prefix of right: the longest one,
+    or the one closest to expected_overlap characters (repetitive text can have
+    several). Windows that do not overlap are joined with a paragraph break.
+    """
+    probe = right[:probe_chars]
+    sizes = []
+    start = left.find(probe) if probe else -1
+    while start >= 0:
+        if right.startswith(left[start:]):
+            sizes.append(len(left) - start)
+        start = left.find(probe, start + 1)
+    # Overlaps shorter than the probe
+    sizes.extend(size for size in range(min(len(left), len(probe) - 1), 0, -1) if left.endswith(right[:size]))
+    if not sizes:
+        return f"{left}\n\n{right}"
+    size = max(sizes) if expected_overlap is None else min(sizes, key=lambda n: abs(n - expected_overlap))
+    return left + right[size:]
+
+
+def split_chunks(text: str, chunk_size: int, overlap: int, model: str = "gpt-4") -> List[Tuple[str, int, int]]:
+    """All of iter_chunks as a list (a picklable result, for running in a worker process)."""
+    return list(iter_chunks(text, chunk_size, overlap, model))
+
+
+def iter_chunks(text: str, chunk_size: int, overlap: int,
+                model: str = "gpt-4") -> Iterator[Tuple[str, int, int]]:
+    """
+    Stream overlapping (chunk_text, start_token, end_token) windows over text.
+
+    Text is encoded one segment at a time, so only about one segment of tokens
+    is held in memory, and chunk texts are sliced from the input instead of
+    being decoded. Chunks end at the last paragraph break in their second half,
+    else the last sentence break, else at chunk_size tokens.
+    """
+    enc = get_encoding(model)
+    segments = _segments(text, SEGMENT_CHARS)
+    tokens: List[int] = []
+    offsets: List[int] = []  # Character offset of each buffered token
+    buffered_end = 0  # Character offset where the buffered tokens end
+    position = 0  # Token offset of tokens[0] within the whole text
+    exhausted = False
+    min_tokens = max(overlap + 1, chunk_size // 2)
+
+    while True:
+        while not exhausted and len(tokens) <= chunk_size:
+            span = next(segments, None)
+            if span is None:
+                exhausted = True
+                break
+            seg_tokens, seg_offsets = _encode_segment(enc, text, *span)
+            tokens.extend(seg_tokens)
+            offsets.extend(seg_offsets)
+            buffered_end = span[1]
+        if not tokens:
+            return
+
+        size = min(chunk_size, len(tokens))
+        final = exhausted and size == len(tokens)
+        if not final and size > min_tokens:
+            window_end = offsets[size]
+            cut = _snap(text, offsets[min_tokens], window_end, _PARAGRAPH_BREAK)
+            if cut < 0:
+                cut = _snap(text, offsets[min_tokens], window_end, _SENTENCE_BREAK)
+            if cut > 0:
+                # End before the token containing the break end (tokens carry their leading space)
+                size = max(bisect.bisect_right(offsets, cut, min_tokens, size + 1) - 1, min_tokens)
+
+        char_end = offsets[size] if size < len(tokens) else buffered_end
+        yield text[offsets[0]:char_end], position, position + size
+        if final:
+            return
+
+        step = max(size - overlap, 1)
+        del tokens[:step]
+        del offsets[:step]
+        position += step